@@ -0,0 +1,138 @@
+"""
+Локальный фейковый Bot API для проверки режима webhook без Telegram.
+
+1. Запустить фейковый сервер:
+    python -m benchmarks.fake_telegram serve --port 8081
+
+2. Запустить бота против него:
+    BOT_MODE=webhook TELEGRAM_API_URL=http://127.0.0.1:8081 WEBHOOK_URL=http://127.0.0.1:8080 python main.py
+
+3. Отправить боту пачку обновлений и посмотреть, как быстро они принимаются:
+    python -m benchmarks.fake_telegram load --webhook http://127.0.0.1:8080/webhook --updates 5000 --users 500
+
+Сервер отвечает на любые методы Bot API успешным ответом и раз в 5 секунд
+печатает, сколько вызовов каждого метода получил.
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import time
+from aiohttp import ClientSession, web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+def fake_message(data, message_ids):
+    chat_id = int(data.get("chat_id") or 0)
+    message = {
+        "message_id": next(message_ids),
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": BOT_USER,
+    }
+    if "text" in data:
+        message["text"] = data["text"]
+    if "photo" in data:
+        message["photo"] = [{"file_id": f"fake-{message['message_id']}", "file_unique_id": "u",
+                             "width": 1, "height": 1}]
+        message["caption"] = data.get("caption")
+    return message
+
+
+def create_fake_api() -> web.Application:
+    calls = collections.Counter()
+    message_ids = itertools.count(1)
+
+    async def handle_method(request: web.Request):
+        method = request.match_info["method"]
+        calls[method] += 1
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method.startswith(("send", "copy", "forward")) or method.startswith("edit"):
+            result = fake_message(data, message_ids)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def report(app):
+        async def loop():
+            while True:
+                await asyncio.sleep(5)
+                if calls:
+                    print("Вызовы Bot API:", dict(calls), flush=True)
+        app["report"] = asyncio.create_task(loop())
+
+    app = web.Application()
+    app.router.add_route("*", "/bot{token}/{method}", handle_method)
+    app.on_startup.append(report)
+    return app
+
+
+def fake_update(update_id, user_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+async def load(webhook, updates, users, concurrency, text, secret):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    statuses = collections.Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with ClientSession() as session:
+        async def post(update_id):
+            payload = fake_update(update_id, 1_000_000 + update_id % users, text)
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(webhook, json=payload, headers=headers) as response:
+                    statuses[response.status] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update_id) for update_id in range(1, updates + 1)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Отправлено обновлений: {updates} за {elapsed:.2f} с ({updates / elapsed:.0f}/с)")
+    print(f"Ответы webhook: {dict(statuses)}")
+    print(f"Время ответа: медиана {latencies[len(latencies) // 2] * 1000:.1f} мс, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="запустить фейковый Bot API")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8081)
+    load_parser = commands.add_parser("load", help="отправить обновления на webhook бота")
+    load_parser.add_argument("--webhook", default="http://127.0.0.1:8080/webhook")
+    load_parser.add_argument("--updates", type=int, default=1000)
+    load_parser.add_argument("--users", type=int, default=100)
+    load_parser.add_argument("--concurrency", type=int, default=100)
+    load_parser.add_argument("--text", default="/start")
+    load_parser.add_argument("--secret")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        web.run_app(create_fake_api(), host=args.host, port=args.port)
+    else:
+        asyncio.run(load(args.webhook, args.updates, args.users, args.concurrency, args.text, args.secret))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Бенчмарк случайной выборки рецептов: RecipeIdSampler против ORDER BY RAND().
+
+Запуск только в памяти (без базы данных):
+    python -m benchmarks.recipe_sampler
+
+С синтетическими таблицами в MySQL из .env (создается таблица bench_recipes):
+    python -m benchmarks.recipe_sampler --mysql
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import aiomysql
+from config import get_db_config
+from database.recipe_catalog import RecipeIdSampler
+
+SIZES = (10_000, 100_000, 1_000_000)
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+PREP_TIMES = ("up_to_30_minutes", "30_to_60_minutes", "more_than_60_minutes")
+
+
+def synthetic_rows(size):
+    rng = random.Random(size)
+    return [(recipe_id, rng.choice(MEAL_TYPES), rng.choice(PREP_TIMES)) for recipe_id in range(1, size + 1)]
+
+
+def time_calls(func, calls):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    return statistics.median(samples), max(samples)
+
+
+def bench_in_memory(calls):
+    print("Выборка из кеша id (мкс на вызов):")
+    for size in SIZES:
+        sampler = RecipeIdSampler()
+        sampler._build(synthetic_rows(size))
+        median, worst = time_calls(lambda: sampler.sample("breakfast", "30_to_60_minutes", 2), calls)
+        print(f"  {size:>9} строк: медиана {median:8.2f}, максимум {worst:8.2f}")
+
+
+async def fill_table(cursor, connection, size):
+    await cursor.execute("DROP TABLE IF EXISTS bench_recipes")
+    await cursor.execute("""
+        CREATE TABLE bench_recipes (
+            id INT PRIMARY KEY,
+            meal_type VARCHAR(20) NOT NULL,
+            preparation_time VARCHAR(30) NOT NULL,
+            calories INT NOT NULL,
+            title VARCHAR(100) NOT NULL
+        )
+    """)
+    rows = synthetic_rows(size)
+    for start in range(0, size, 10_000):
+        chunk = rows[start:start + 10_000]
+        await cursor.executemany(
+            "INSERT INTO bench_recipes (id, meal_type, preparation_time, calories, title) VALUES (%s, %s, %s, %s, %s)",
+            [(recipe_id, meal_type, prep_time, 100 + recipe_id % 700, f"Рецепт {recipe_id}")
+             for recipe_id, meal_type, prep_time in chunk]
+        )
+    await connection.commit()
+    return rows
+
+
+async def time_query(cursor, query, params_factory, calls):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await cursor.execute(query, params_factory())
+        await cursor.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def bench_mysql(calls):
+    config = get_db_config()
+    connection = await aiomysql.connect(host=config['host'], port=config['port'], user=config['user'],
+                                        password=config['password'], db=config['database'])
+    try:
+        async with connection.cursor() as cursor:
+            print("MySQL (мс на запрос, медиана):")
+            for size in SIZES:
+                rows = await fill_table(cursor, connection, size)
+                sampler = RecipeIdSampler()
+                sampler._build(rows)
+                prep_time = "30_to_60_minutes"
+
+                order_by_rand = await time_query(cursor, """
+                    SELECT * FROM bench_recipes
+                    WHERE meal_type = %s
+                      AND (preparation_time = %s OR
+                           (preparation_time = '30_to_60_minutes' AND %s IN ('30_to_60_minutes', 'more_than_60_minutes')) OR
+                           (preparation_time = 'more_than_60_minutes'))
+                    ORDER BY RAND()
+                    LIMIT 2
+                """, lambda: ("breakfast", prep_time, prep_time), calls)
+
+                by_primary_key = await time_query(
+                    cursor, "SELECT * FROM bench_recipes WHERE id IN (%s, %s)",
+                    lambda: (sampler.sample("breakfast", prep_time, 2) + [0, 0])[:2], calls)
+
+                print(f"  {size:>9} строк: ORDER BY RAND() {order_by_rand:9.2f}, кеш id + PK {by_primary_key:6.2f}")
+            await cursor.execute("DROP TABLE IF EXISTS bench_recipes")
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000, help="количество выборок на размер таблицы")
+    parser.add_argument("--mysql", action="store_true", help="сравнить с ORDER BY RAND() в настоящей MySQL")
+    args = parser.parse_args()
+
+    bench_in_memory(args.calls)
+    if args.mysql:
+        asyncio.run(bench_mysql(min(args.calls, 50)))
+
+
+if __name__ == "__main__":
+    main()
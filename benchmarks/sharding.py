@@ -0,0 +1,126 @@
+"""
+Бенчмарк шардирования: пропускная способность обработки обновлений при 1..N процессах.
+
+Координатор (этот процесс) пересылает обновления через ShardRouter в процессы-шарды.
+Каждый шард - aiohttp-приложение с UpdateWorkerPool и Dispatcher, обработчик которого
+тратит заданное время CPU (имитация фильтров aiogram, обработчиков и работы с кешами).
+База данных и Telegram не нужны.
+
+    python -m benchmarks.sharding --updates 20000 --cpu-ms 1
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from aiohttp import ClientError, ClientSession, web
+from aiogram import Bot, Dispatcher, types
+from sharding import ShardRouter
+from webhook import UpdateWorkerPool, create_webhook_app
+
+BASE_PORT = 8300
+
+
+def burn_cpu(milliseconds):
+    deadline = time.process_time() + milliseconds / 1000
+    while time.process_time() < deadline:
+        pass
+
+
+def run_shard(port, cpu_ms):
+    async def serve():
+        dispatcher = Dispatcher(Bot(token="1:benchmark"))
+
+        @dispatcher.message_handler()
+        async def handle(message: types.Message):
+            burn_cpu(cpu_ms)
+
+        worker_pool = UpdateWorkerPool(dispatcher, workers=8, queue_size=2000)
+        worker_pool.start()
+        app = create_webhook_app(worker_pool, "/webhook")
+        app.router.add_get("/stats", lambda request: web.json_response(worker_pool.stats()))
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def fake_update(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+            "text": "benchmark",
+        },
+    }
+
+
+async def processed_total(session, ports):
+    total = 0
+    for port in ports:
+        async with session.get(f"http://127.0.0.1:{port}/stats") as response:
+            total += (await response.json())["processed"]
+    return total
+
+
+async def wait_ready(session, ports):
+    for _ in range(100):
+        try:
+            await processed_total(session, ports)
+            return
+        except ClientError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Шарды не запустились")
+
+
+async def measure(shard_count, updates, users):
+    ports = [BASE_PORT + shard_id for shard_id in range(shard_count)]
+    router = ShardRouter([f"http://127.0.0.1:{port}/webhook" for port in ports], queue_size=10_000)
+    async with ClientSession() as session:
+        await wait_ready(session, ports)
+        router.start()
+        started = time.perf_counter()
+        for update_id in range(1, updates + 1):
+            await router.route(fake_update(update_id, 1_000_000 + update_id % users))
+        while await processed_total(session, ports) < updates:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    await router.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--cpu-ms", type=float, default=1.0, help="время CPU на одно обновление")
+    parser.add_argument("--max-shards", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"Ядер: {os.cpu_count()}, обновлений: {args.updates}, CPU на обновление: {args.cpu_ms} мс")
+    shard_counts = sorted({1, *(count for count in (2, 4, 8, 16) if count <= args.max_shards), args.max_shards})
+    baseline = None
+    for shard_count in shard_counts:
+        processes = [multiprocessing.Process(target=run_shard, args=(BASE_PORT + shard_id, args.cpu_ms), daemon=True)
+                     for shard_id in range(shard_count)]
+        for process in processes:
+            process.start()
+        try:
+            elapsed = asyncio.run(measure(shard_count, args.updates, args.users))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+
+        throughput = args.updates / elapsed
+        baseline = baseline or throughput
+        print(f"  шардов: {shard_count:2d}  {throughput:8.0f} обновлений/с  ускорение x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import inspect
+import logging
+import time
+from aiogram import Dispatcher, types
+from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters.state import State
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Маршрут для любого состояния FSM (как state="*" у aiogram)
+ANY_STATE = "*"
+# Ключ "любой callback_data" в заданном состоянии
+ANY_DATA = None
+
+
+class CallbackRoute:
+    __slots__ = ("name", "handler", "with_state", "calls", "errors", "total_time", "max_time")
+
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = handler
+        # Передаем FSMContext только обработчикам, которые его принимают (как это делает aiogram)
+        self.with_state = "state" in inspect.signature(handler).parameters
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def observe(self, elapsed, failed):
+        self.calls += 1
+        self.errors += failed
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+
+def _state_name(state):
+    if state is None or state == ANY_STATE:
+        return state
+    return state.state if isinstance(state, State) else str(state)
+
+
+class CallbackRouter:
+    """
+    Маршрутизация callback-кнопок одним обработчиком aiogram.
+
+    Точные значения ищутся в словаре по части callback_data до ':', префиксы
+    (например, "tz_" или "check_payment_") - по префиксному дереву, так что
+    стоимость не зависит от числа маршрутов. Состояние FSM учитывается так же,
+    как у aiogram: маршрут без состояния срабатывает только вне сценариев,
+    ANY_STATE - в любом состоянии.
+    """
+
+    def __init__(self):
+        # (состояние, голова callback_data или ANY_DATA) -> маршрут
+        self._exact = {}
+        # состояние -> префиксное дерево {символ: узел}, маршрут узла хранится под ключом None
+        self._prefixes = {}
+        self.routes = []
+
+    def add(self, handler, data: str = ANY_DATA, prefix: str = None, state=None, name: str = None):
+        state = _state_name(state)
+        if name is None:
+            name = prefix + "*" if prefix is not None else data or "*"
+            if state is not None:
+                name = f"{name} [{state}]"
+        route = CallbackRoute(name, handler)
+        if prefix is not None:
+            node = self._prefixes.setdefault(state, {})
+            for char in prefix:
+                node = node.setdefault(char, {})
+            previous, node[None] = node.get(None), route
+        else:
+            previous, self._exact[(state, data)] = self._exact.get((state, data)), route
+        # Повторная регистрация того же маршрута заменяет прежний
+        if previous is not None:
+            self.routes.remove(previous)
+        self.routes.append(route)
+        return route
+
+    def _match_prefix(self, state, callback_data):
+        node = self._prefixes.get(state)
+        route = None
+        if node is None:
+            return None
+        for char in callback_data:
+            node = node.get(char)
+            if node is None:
+                break
+            route = node.get(None, route)
+        return route
+
+    def resolve(self, state, callback_data):
+        head = callback_data.partition(":")[0]
+        for candidate in (state, ANY_STATE):
+            route = (self._exact.get((candidate, head))
+                     or self._match_prefix(candidate, callback_data)
+                     or self._exact.get((candidate, ANY_DATA)))
+            if route is not None:
+                return route
+        return None
+
+    async def match(self, callback_query: types.CallbackQuery):
+        if callback_query.data is None:
+            return False
+        state = await Dispatcher.get_current().current_state().get_state()
+        route = self.resolve(state, callback_query.data)
+        return {"callback_route": route} if route is not None else False
+
+    async def handle(self, callback_query: types.CallbackQuery, state: FSMContext, callback_route: CallbackRoute):
+        started = time.perf_counter()
+        failed = True
+        try:
+            if callback_route.with_state:
+                await callback_route.handler(callback_query, state=state)
+            else:
+                await callback_route.handler(callback_query)
+            failed = False
+        finally:
+            callback_route.observe(time.perf_counter() - started, failed)
+
+    def register(self, dp: Dispatcher):
+        dp.register_callback_query_handler(self.handle, self.match, state=ANY_STATE)
+        logger.info(f"Зарегистрировано маршрутов callback-кнопок: {len(self.routes)}.")
+
+    def stats(self, limit: int = 10):
+        """Маршруты с наибольшим суммарным временем обработки."""
+        routes = sorted(self.routes, key=lambda route: route.total_time, reverse=True)[:limit]
+        return [{
+            "name": route.name,
+            "calls": route.calls,
+            "errors": route.errors,
+            "avg_ms": route.total_time / route.calls * 1000 if route.calls else 0.0,
+            "max_ms": route.max_time * 1000,
+        } for route in routes if route.calls]
+
+
+callback_router = CallbackRouter()
@@ -6,6 +6,28 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 PAYMENT_PROVIDER_TOKEN = os.getenv("PAYMENT_PROVIDER_TOKEN")
 
+# Telegram ID администраторов через запятую (служебные команды бота)
+ADMIN_IDS = {int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id.strip()}
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Адрес Bot API; можно указать локальный сервер (например, benchmarks/fake_telegram.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный адрес бота, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+# Воркеры обработки обновлений в режиме webhook и общий размер их очередей
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 32))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+
+# Шардирование по tg_user_id: число процессов-шардов, номер текущего шарда
+# и первый локальный порт шардов (их запускает координатор sharding.py)
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 1))
+SHARD_ID = int(os.getenv("SHARD_ID", 0))
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", 8100))
+
 # Конфигурация для базы данных
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = int(os.getenv("DB_PORT", 3306))
@@ -13,6 +35,42 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
 
+# Пул соединений MySQL: минимум и максимум соединений, сколько ждать свободное (секунды)
+# и через сколько секунд простоя лишние соединения сверх минимума закрываются
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 5))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 100))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 10))
+DB_POOL_IDLE_SECONDS = float(os.getenv("DB_POOL_IDLE_SECONDS", 300))
+
+# Размер кеша идентификаторов пользователей (tg_user_id <-> users.id)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 100000))
+
+# Сколько уведомлений о приеме пищи отправляется одновременно
+NOTIFICATION_CONCURRENCY = int(os.getenv("NOTIFICATION_CONCURRENCY", 50))
+
+# Лимиты исходящих сообщений Telegram: всего в секунду и в секунду на один чат
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+# Сколько запросов к Telegram из очереди выполняется одновременно
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", 16))
+
+# Хранилище состояний FSM: размер кеша и период записи изменений в базу (секунды)
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 100000))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 1))
+
+# Платежи: провайдер (yookassa или stub - локальная заглушка для нагрузочных тестов),
+# потоки для блокирующего SDK, таймаут одной попытки (секунды) и число попыток
+PAYMENT_PROVIDER = os.getenv("PAYMENT_PROVIDER", "yookassa")
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", 8))
+PAYMENT_TIMEOUT = float(os.getenv("PAYMENT_TIMEOUT", 15))
+PAYMENT_RETRIES = int(os.getenv("PAYMENT_RETRIES", 3))
+PAYMENT_STUB_LATENCY = float(os.getenv("PAYMENT_STUB_LATENCY", 0.3))
+
+# Как часто перечитываются приветствия и прощания из meal_greetings (секунды)
+MEAL_TEXTS_TTL = float(os.getenv("MEAL_TEXTS_TTL", 600))
+# Как часто перечитывается каталог рецептов (секунды): так правки доходят до всех шардов
+RECIPE_CATALOG_TTL = float(os.getenv("RECIPE_CATALOG_TTL", 900))
+
 def get_db_config():
     return {
         "host": DB_HOST,
@@ -7,9 +7,12 @@ import aiomysql
 logger = logging.getLogger(__name__)
 
 class AppContext:
-    def __init__(self, dispatcher: Dispatcher, pool: aiomysql.Pool):
+    def __init__(self, dispatcher: Dispatcher, pool: aiomysql.Pool, shard_id: int = 0, shard_count: int = 1):
         self.dispatcher = dispatcher
         self.pool = pool
+        # Номер шарда этого процесса и общее число шардов (см. sharding.py)
+        self.shard_id = shard_id
+        self.shard_count = shard_count
         self.second_breakfast_chosen = {}
         self.last_update = {}
         self.lock = asyncio.Lock()  # Создаем асинхронную блокировку
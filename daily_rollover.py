@@ -0,0 +1,98 @@
+import logging
+from datetime import datetime
+import pytz
+from aiomysql import DictCursor
+from apscheduler.triggers.cron import CronTrigger
+from context import AppContext
+from database.user_day import DEFAULT_UTC_OFFSET_MINUTES, local_date, parse_utc_offset
+from scheduler import scheduler
+from sharding import shard_condition
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RESET_COLUMNS = "calories_consumed = 0, breakfast_flag = 0, second_breakfast_flag = 0, lunch_flag = 0, dinner_flag = 0"
+
+
+async def timezone_buckets(context: AppContext) -> dict:
+    """Смещение от UTC в минутах -> значения meal_schedules.user_timezone с этим смещением."""
+    async with context.pool.acquire() as connection:
+        async with connection.cursor(DictCursor) as cursor:
+            await cursor.execute("SELECT DISTINCT user_timezone FROM meal_schedules WHERE user_timezone IS NOT NULL")
+            rows = await cursor.fetchall()
+
+    buckets = {}
+    for row in rows:
+        offset = parse_utc_offset(row['user_timezone'])
+        if offset is not None:
+            buckets.setdefault(offset, []).append(row['user_timezone'])
+    buckets.setdefault(DEFAULT_UTC_OFFSET_MINUTES, [])
+    return buckets
+
+
+async def rollover_user_days(context: AppContext, now: datetime = None) -> int:
+    """
+    Обнуляет дневные счетчики user_calories пользователям, у которых наступили новые сутки.
+
+    Пользователи группируются по часовому поясу: на каждый пояс один UPDATE по всем
+    его строкам, дата которых меньше местной сегодняшней. Повторный запуск ничего не меняет.
+    """
+    now = now or datetime.now(pytz.utc)
+    buckets = await timezone_buckets(context)
+    known_timezones = [timezone for timezones in buckets.values() for timezone in timezones]
+    shard, shard_params = shard_condition(context)
+    total = 0
+
+    async with context.pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            for offset, timezones in buckets.items():
+                today = local_date(offset, now)
+                conditions, params = [], []
+                if timezones:
+                    placeholders = ", ".join(["%s"] * len(timezones))
+                    conditions.append(f"user_id IN (SELECT user_id FROM meal_schedules WHERE user_timezone IN ({placeholders}))")
+                    params += timezones
+                if offset == DEFAULT_UTC_OFFSET_MINUTES:
+                    # Сюда же попадают пользователи без выбранного (или с неразобранным) часовым поясом
+                    placeholders = ", ".join(["%s"] * len(known_timezones)) or "NULL"
+                    conditions.append(f"user_id NOT IN (SELECT user_id FROM meal_schedules "
+                                      f"WHERE user_timezone IN ({placeholders}))")
+                    params += known_timezones
+
+                await cursor.execute(
+                    f"""
+                    UPDATE user_calories
+                    SET {RESET_COLUMNS}, date = %s
+                    WHERE date < %s AND ({" OR ".join(conditions)}) AND {shard}
+                    """,
+                    (today, today, *params, *shard_params)
+                )
+                total += cursor.rowcount
+            await connection.commit()
+
+    if total:
+        logger.info(f"Новые сутки: обнулены счетчики {total} пользователей.")
+    return total
+
+
+async def run_rollover(context: AppContext):
+    try:
+        await rollover_user_days(context)
+    except Exception as e:
+        logger.error(f"Ошибка при смене суток в user_calories: {e}")
+
+
+async def schedule_daily_rollover(context: AppContext):
+    # Любой часовой пояс смещен от UTC на число минут, кратное 15, поэтому полночь
+    # каждого пояса совпадает с одним из запусков
+    scheduler.add_job(
+        run_rollover,
+        CronTrigger(minute='0,15,30,45', second=0, timezone=pytz.utc),
+        args=[context],
+        id='daily_rollover',
+        replace_existing=True,
+        coalesce=True,
+        misfire_grace_time=300
+    )
+    logger.info("Смена суток в user_calories запланирована каждые 15 минут.")
@@ -1,8 +1,11 @@
-import random
 import aiomysql
-from config import get_db_config
+from config import get_db_config, DB_POOL_MIN, DB_POOL_MAX
+from database.recipe_catalog import recipe_id_sampler
+from database.identity_cache import user_identity_cache
+from database.user_day import user_today
+from database.user_profile import user_profiles
+from database.meal_texts import meal_texts
 import pytz
-from datetime import date
 from decimal import Decimal
 import datetime
 import logging
@@ -12,6 +15,17 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Счетчики дня в user_calories. Ежедневно их обнуляет daily_rollover.py, а запись,
+# пришедшая раньше него, обнуляет их сама в том же upsert (date обновляется последним)
+USER_DAY_COLUMNS = ("calories_consumed", "breakfast_flag", "second_breakfast_flag", "lunch_flag", "dinner_flag")
+
+
+def new_day_assignments(skip=()):
+    return ", ".join(
+        f"{column} = IF(date < VALUES(date), 0, {column})" for column in USER_DAY_COLUMNS if column not in skip
+    )
+
+
 async def create_pool():
     config = get_db_config()
     try:
@@ -21,8 +35,8 @@ async def create_pool():
             user=config['user'],
             password=config['password'],
             db=config['database'],
-            minsize=1,
-            maxsize=100
+            minsize=DB_POOL_MIN,
+            maxsize=DB_POOL_MAX
         )
         return pool
     except KeyError as e:
@@ -34,66 +48,40 @@ async def create_pool():
 
 
 async def get_recipes(pool, meal_type, preparation_time):
+    # Случайные id берем из кеша в памяти, а строки читаем по первичному ключу,
+    # чтобы не сортировать всю таблицу через ORDER BY RAND()
+    await recipe_id_sampler.ensure_loaded(pool)
+    recipe_ids = recipe_id_sampler.sample(meal_type, preparation_time, 2)
+    if not recipe_ids:
+        return []
+
     async with pool.acquire() as connection:
         async with connection.cursor(aiomysql.DictCursor) as cursor:
-            query = """
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            query = f"""
             SELECT * 
             FROM recipes 
-            WHERE meal_type = %s 
-              AND (preparation_time = %s OR 
-                   (preparation_time = '30_to_60_minutes' AND %s IN ('30_to_60_minutes', 'more_than_60_minutes')) OR 
-                   (preparation_time = 'more_than_60_minutes'))
-            ORDER BY RAND() 
-            LIMIT 2
+            WHERE id IN ({placeholders})
             """
-            await cursor.execute(query, (meal_type, preparation_time, preparation_time))
-            recipes = await cursor.fetchall()
-            return recipes
+            await cursor.execute(query, recipe_ids)
+            rows = {recipe['id']: recipe for recipe in await cursor.fetchall()}
+            # Сохраняем случайный порядок выборки
+            return [rows[recipe_id] for recipe_id in recipe_ids if recipe_id in rows]
 
 
 async def get_greeting(pool, meal_type):
-    async with pool.acquire() as connection:
-        async with connection.cursor(aiomysql.DictCursor) as cursor:
-            query = """
-            SELECT greeting_text 
-            FROM meal_greetings 
-            WHERE meal_type = %s 
-              AND greeting_type = 'greeting'
-            """
-            await cursor.execute(query, (meal_type,))
-            greetings = await cursor.fetchall()
-            if greetings:
-                return random.choice(greetings)['greeting_text']
-            else:
-                return None
+    return await meal_texts.pick(pool, meal_type, 'greeting')
 
 
 async def get_farewell(pool, meal_type):
-    async with pool.acquire() as connection:
-        async with connection.cursor(aiomysql.DictCursor) as cursor:
-            query = """
-            SELECT greeting_text 
-            FROM meal_greetings 
-            WHERE meal_type = %s 
-              AND greeting_type = 'farewell'
-            """
-            await cursor.execute(query, (meal_type,))
-
-            # Извлекаем все прощальные сообщения для выбранного типа приема пищи
-            farewells = await cursor.fetchall()
-
-            # Прочитываем все оставшиеся результаты, чтобы избежать ошибок
-            while await cursor.nextset():
-                pass
-
-            # Если список прощальных сообщений не пуст, выбираем случайное прощальное сообщение
-            if farewells:
-                return random.choice(farewells)['greeting_text']
-            else:
-                return None  # или любое другое значение, если прощальных сообщений не найдено
+    return await meal_texts.pick(pool, meal_type, 'farewell')
 
 
 async def get_tg_user_id_by_user_id(pool, user_id: int) -> int:
+    tg_user_id = user_identity_cache.get_tg_user_id(user_id)
+    if tg_user_id is not None:
+        return tg_user_id
+
     async with pool.acquire() as connection:
         async with connection.cursor(aiomysql.DictCursor) as cursor:
             query = """
@@ -107,39 +95,36 @@ async def get_tg_user_id_by_user_id(pool, user_id: int) -> int:
             result = await cursor.fetchone()
 
             if result:
+                user_identity_cache.put(user_id, result['tg_user_id'])
                 return result['tg_user_id']
             else:
                 return None
 
 
 async def user_exists(pool, user_id):
-    query = "SELECT COUNT(*) FROM users WHERE id = %s"
     try:
-        async with pool.acquire() as connection:
-            async with connection.cursor() as cursor:
-                await cursor.execute(query, (user_id,))
-                count = await cursor.fetchone()
-                return count[0] > 0
+        return await user_profiles.get(pool, user_id) is not None
     except aiomysql.MySQLError as err:
         logger.error(f"Ошибка при проверке существования пользователя: {err}")
         return False
 
 
 async def update_calories(pool, user_id, calories):
-    today = datetime.date.today()
     if not await user_exists(pool, user_id):
         logger.error(f"Пользователь с ID {user_id} не существует.")
         return None
+    today = await user_today(pool, user_id)
     try:
         async with pool.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
-                    """
+                    f"""
                     INSERT INTO user_calories (user_id, calories_consumed, date)
                     VALUES (%s, %s, %s)
                     ON DUPLICATE KEY UPDATE 
-                        calories_consumed = calories_consumed + VALUES(calories_consumed),
-                        date = VALUES(date)
+                        {new_day_assignments(skip=("calories_consumed",))},
+                        calories_consumed = IF(date < VALUES(date), 0, calories_consumed) + VALUES(calories_consumed),
+                        date = GREATEST(date, VALUES(date))
                     """, (user_id, calories, today)
                 )
                 await connection.commit()
@@ -187,26 +172,16 @@ async def get_calories_consumed(pool, user_id):
 
 
 async def get_calorie_norm(pool, user_id):
-    async with pool.acquire() as connection:
-        async with connection.cursor(aiomysql.DictCursor) as cursor:
-            try:
-                await cursor.execute(
-                    """
-                    SELECT calorie_norm
-                    FROM users
-                    WHERE id = %s
-                    """, (user_id,)
-                )
-                result = await cursor.fetchone()
+    try:
+        profile = await user_profiles.get(pool, user_id)
+    except aiomysql.Error as err:
+        logger.error(f"Ошибка базы данных при получении нормы калорий: {err}")
+        return None
 
-                if result:
-                    return result['calorie_norm']
-                else:
-                    logger.warning(f"Не найдена норма калорий для пользователя с id {user_id}.")
-                    return None
-            except aiomysql.Error as err:
-                logger.error(f"Ошибка базы данных при получении нормы калорий: {err}")
-                return None
+    if profile:
+        return profile.calorie_norm
+    logger.warning(f"Не найдена норма калорий для пользователя с id {user_id}.")
+    return None
 
 
 async def get_recipe_by_id(pool, recipe_id):
@@ -241,6 +216,10 @@ async def get_recipe_by_id(pool, recipe_id):
 
 
 async def get_user_id_by_tg_user_id(pool, tg_user_id: int):
+    user_id = user_identity_cache.get_user_id(tg_user_id)
+    if user_id is not None:
+        return user_id
+
     async with pool.acquire() as connection:
         async with connection.cursor(aiomysql.DictCursor) as cursor:
             try:
@@ -254,6 +233,7 @@ async def get_user_id_by_tg_user_id(pool, tg_user_id: int):
                 result = await cursor.fetchone()
 
                 if result:
+                    user_identity_cache.put(result['id'], tg_user_id)
                     return result['id']
                 else:
                     return None
@@ -264,60 +244,34 @@ async def get_user_id_by_tg_user_id(pool, tg_user_id: int):
 
 async def get_meals_per_day(pool, user_id: int) -> int:
     logging.debug(f"Получение количества приемов пищи для пользователя с ID {user_id}.")
+    try:
+        profile = await user_profiles.get(pool, user_id)
+    except aiomysql.Error as err:
+        logging.error(
+            f"Ошибка базы данных при получении количества приемов пищи для пользователя с ID {user_id}: {err}")
+        return None  # Возвращаем None в случае ошибки
 
-    async with pool.acquire() as connection:
-        async with connection.cursor(aiomysql.DictCursor) as cursor:
-            try:
-                query = """
-                SELECT meals_per_day
-                FROM users
-                WHERE id = %s
-                """
-                logging.debug(f"Выполнение запроса: {query} с параметром {user_id}.")
-                await cursor.execute(query, (user_id,))
-                result = await cursor.fetchone()
-
-                if result:
-                    meals_per_day = result['meals_per_day']
-                    logging.info(f"Количество приемов пищи для пользователя с ID {user_id}: {meals_per_day}.")
-                    return meals_per_day
-                else:
-                    logging.warning(f"Пользователь с ID {user_id} не найден в базе данных.")
-                    return None  # Возвращаем None, чтобы указать, что данных нет
-
-            except aiomysql.Error as err:
-                logging.error(
-                    f"Ошибка базы данных при получении количества приемов пищи для пользователя с ID {user_id}: {err}")
-                return None  # Возвращаем None в случае ошибки
+    if profile:
+        logging.info(f"Количество приемов пищи для пользователя с ID {user_id}: {profile.meals_per_day}.")
+        return profile.meals_per_day
+    logging.warning(f"Пользователь с ID {user_id} не найден в базе данных.")
+    return None  # Возвращаем None, чтобы указать, что данных нет
 
 
 async def check_existing_meal_times(pool, user_id: int) -> bool:
-    async with pool.acquire() as connection:
-        async with connection.cursor(aiomysql.DictCursor) as cursor:
-            try:
-                logging.info(f"Проверка существующих времен приема пищи для пользователя с ID {user_id}")
-
-                # Выполняем запрос для подсчета количества записей
-                await cursor.execute("SELECT COUNT(*) as count FROM meal_schedules WHERE user_id = %s", (user_id,))
-                result = await cursor.fetchone()
-
-                if result:
-                    logging.info(f"Результат запроса для пользователя {user_id}: {result}")
-                    found_meals = result['count'] > 0
-
-                    if found_meals:
-                        logging.info(f"Для пользователя {user_id} найдены времена приема пищи (количество: {result['count']})")
-                    else:
-                        logging.info(f"Для пользователя {user_id} не найдены времена приема пищи.")
-
-                    return found_meals
-                else:
-                    logging.warning(f"Пустой результат для пользователя {user_id}.")
-                    return False
+    logging.info(f"Проверка существующих времен приема пищи для пользователя с ID {user_id}")
+    try:
+        profile = await user_profiles.get(pool, user_id)
+    except aiomysql.Error as err:
+        logging.error(f"Ошибка базы данных при проверке времен приема пищи для пользователя {user_id}: {err}")
+        return False
 
-            except aiomysql.Error as err:
-                logging.error(f"Ошибка базы данных при проверке времен приема пищи для пользователя {user_id}: {err}")
-                return False
+    found_meals = bool(profile and profile.has_meal_schedule)
+    if found_meals:
+        logging.info(f"Для пользователя {user_id} найдены времена приема пищи.")
+    else:
+        logging.info(f"Для пользователя {user_id} не найдены времена приема пищи.")
+    return found_meals
 
 
 
@@ -373,25 +327,16 @@ async def update_dinner_time_in_db(pool, user_id, new_dinner_time):
 
 
 async def get_user_timezone(pool, user_id):
-    async with pool.acquire() as connection:
-        async with connection.cursor(aiomysql.DictCursor) as cursor:
-            try:
-                query = '''
-                    SELECT user_timezone
-                    FROM meal_schedules
-                    WHERE user_id = %s
-                '''
-                await cursor.execute(query, (user_id,))
-                result = await cursor.fetchone()
+    try:
+        profile = await user_profiles.get(pool, user_id)
+    except aiomysql.Error as err:
+        logging.error(f"Error retrieving user timezone: {err}")
+        return None
 
-                if result:
-                    return result['user_timezone']
-                else:
-                    logging.info(f"No timezone found for user_id {user_id}.")
-                    return None
-            except aiomysql.Error as err:
-                logging.error(f"Error retrieving user timezone: {err}")
-                return None
+    if profile and profile.has_meal_schedule:
+        return profile.user_timezone
+    logging.info(f"No timezone found for user_id {user_id}.")
+    return None
 
 
 def convert_timezone_to_offset(timezone_str):
@@ -409,7 +354,7 @@ def convert_timezone_to_offset(timezone_str):
 
 
 async def get_meal_status_for_today(pool, user_db_id: int):
-    today = date.today()
+    today = await user_today(pool, user_db_id)
     query = """
     SELECT breakfast_flag, second_breakfast_flag, lunch_flag, dinner_flag
     FROM user_calories
@@ -463,43 +408,23 @@ async def update_meal_status(pool, user_db_id: int, meal_type: str, status: int)
         logging.error(f"Неправильный тип приема пищи: {meal_type}")
         raise ValueError(f"Неправильный тип приема пищи: {meal_type}")
 
-    # SQL запрос для проверки даты
-    check_date_query = "SELECT date FROM user_calories WHERE user_id = %s"
-
-    # SQL запрос для обнуления всех флагов
-    reset_flags_query = """
-        INSERT INTO user_calories (user_id, date, breakfast_flag, lunch_flag, dinner_flag)
-        VALUES (%s, CURDATE(), 0, 0, 0)
-        ON DUPLICATE KEY UPDATE breakfast_flag = 0, lunch_flag = 0, dinner_flag = 0;
-    """
-
-    # SQL запрос для обновления конкретного флага
+    # Один upsert: если строка осталась со вчерашнего дня, счетчики дня обнуляются в нем же
     update_flag_query = f"""
         INSERT INTO user_calories (user_id, date, {column_name})
-        VALUES (%s, CURDATE(), %s)
-        ON DUPLICATE KEY UPDATE {column_name} = %s;
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            {new_day_assignments(skip=(column_name,))},
+            {column_name} = VALUES({column_name}),
+            date = GREATEST(date, VALUES(date));
     """
 
+    status = 1 if status else 0
+    today = await user_today(pool, user_db_id)
     async with pool.acquire() as connection:
         async with connection.cursor() as cursor:
             try:
-                # Проверка даты
-                await cursor.execute(check_date_query, (user_db_id,))
-                result = await cursor.fetchone()
-                current_date = datetime.date.today()
-
-                if result:
-                    stored_date = result[0]  # Предполагается, что result[0] уже типа datetime.date
-                    if stored_date != current_date:
-                        # Если дата не соответствует сегодняшней, обнуляем все флаги
-                        await cursor.execute(reset_flags_query, (user_db_id,))
-                        await connection.commit()
-
-                # Обновление флага для конкретного приема пищи
-                status = 1 if status else 0
-                await cursor.execute(update_flag_query, (user_db_id, status, status))
+                await cursor.execute(update_flag_query, (user_db_id, today, status))
                 await connection.commit()
-
             except Exception as e:
                 logging.error(f"Ошибка при обновлении статуса приема пищи: {e}")
 
@@ -513,7 +438,7 @@ async def subtract_calories(pool, user_id, recipe_calories):
                     recipe_calories = float(recipe_calories)
 
                 # Уменьшаем количество потребленных калорий
-                today = datetime.date.today()
+                today = await user_today(pool, user_id)
 
                 await cursor.execute(
                     """
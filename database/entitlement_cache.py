@@ -0,0 +1,116 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+import aiomysql
+from config import USER_CACHE_SIZE
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Страховочный срок жизни записей без даты окончания подписки (на случай ручных правок в базе)
+ENTITLEMENT_TTL_SECONDS = 3600
+
+ENTITLEMENT_QUERY = """
+    SELECT u.id, u.is_registered, s.user_id AS subscription_user_id, s.is_active, s.end_date
+    FROM users u
+    LEFT JOIN subscriptions s ON s.user_id = u.id
+    WHERE u.tg_user_id = %s
+    ORDER BY s.is_active DESC, s.end_date DESC
+    LIMIT 1
+"""
+
+
+class Entitlement:
+    """Результат проверки подписки пользователя."""
+
+    __slots__ = ("user_id", "allowed", "expires_at")
+
+    def __init__(self, user_id, allowed: bool, expires_at: float):
+        self.user_id = user_id
+        self.allowed = allowed
+        # Время (time.time()), до которого решение остается верным
+        self.expires_at = expires_at
+
+
+def evaluate_entitlement(row, now: datetime = None) -> Entitlement:
+    """
+    Повторяет правила SubscriptionMiddleware: незарегистрированные пользователи и
+    пользователи без записи в subscriptions проходят, остальным нужна активная подписка.
+    """
+    now = now or datetime.now()
+    fallback_expiry = time.time() + ENTITLEMENT_TTL_SECONDS
+
+    if not row or not row.get('is_registered'):
+        return Entitlement(row['id'] if row else None, True, fallback_expiry)
+
+    if row.get('subscription_user_id') is None:
+        return Entitlement(row['id'], True, fallback_expiry)
+
+    end_date = row.get('end_date')
+    if row.get('is_active') and end_date and end_date > now:
+        # Решение действует ровно до окончания подписки
+        return Entitlement(row['id'], True, time.time() + (end_date - now).total_seconds())
+
+    return Entitlement(row['id'], False, fallback_expiry)
+
+
+class EntitlementCache:
+    """
+    LRU-кеш доступа к боту по подписке, ключ - tg_user_id.
+
+    Одна запись заменяет три запроса SubscriptionMiddleware на каждое обновление.
+    Записи сбрасываются при активации подписки, пробного дня и при деактивации
+    просроченных подписок.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._tg_user_ids = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, pool, tg_user_id: int) -> Entitlement:
+        entry = self._entries.get(tg_user_id)
+        if entry is not None and entry.expires_at > time.time():
+            self._entries.move_to_end(tg_user_id)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(ENTITLEMENT_QUERY, (tg_user_id,))
+                row = await cursor.fetchone()
+
+        entry = evaluate_entitlement(row)
+        self._entries[tg_user_id] = entry
+        self._entries.move_to_end(tg_user_id)
+        if entry.user_id is not None:
+            self._tg_user_ids[entry.user_id] = tg_user_id
+        while len(self._entries) > self.maxsize:
+            _, evicted = self._entries.popitem(last=False)
+            if evicted.user_id is not None:
+                self._tg_user_ids.pop(evicted.user_id, None)
+        return entry
+
+    def invalidate(self, tg_user_id=None, user_id=None):
+        if tg_user_id is None and user_id is not None:
+            tg_user_id = self._tg_user_ids.get(user_id)
+        if tg_user_id is None:
+            return
+        entry = self._entries.pop(tg_user_id, None)
+        if entry is not None and entry.user_id is not None:
+            self._tg_user_ids.pop(entry.user_id, None)
+
+    def invalidate_users(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate(user_id=user_id)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+entitlement_cache = EntitlementCache()
@@ -0,0 +1,188 @@
+import asyncio
+import copy
+import json
+import logging
+import typing
+from collections import OrderedDict
+from aiogram.dispatcher.storage import BaseStorage
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_EMPTY = {'state': None, 'data': {}}
+
+
+class MySQLStorage(BaseStorage):
+    """
+    Хранилище состояний FSM в таблице fsm_states.
+
+    Чтение идет из кеша процесса: запись о пользователе читается из базы один раз
+    (в том числе отсутствующая), дальше get_state/get_data не обращаются к базе.
+    Изменения копятся в памяти и пишутся в базу пачкой раз в flush_interval секунд
+    и при остановке бота, поэтому обработчики не ждут записи в базу.
+
+    Строки ключуются по (chat_id, user_id): если пользователи распределены между
+    процессами бота, каждый процесс работает только со своими строками.
+    """
+
+    def __init__(self, pool, cache_size: int = 100000, flush_interval: float = 1.0):
+        self.pool = pool
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        # (chat_id, user_id) -> {'state': ..., 'data': {...}}
+        self._records = OrderedDict()
+        self._dirty = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+    def _key(self, chat, user):
+        chat_id, user_id = self.check_address(chat=chat, user=user)
+        return int(chat_id), int(user_id)
+
+    async def _record(self, chat, user) -> dict:
+        key = self._key(chat, user)
+        record = self._records.get(key)
+        if record is not None:
+            self._records.move_to_end(key)
+            self.hits += 1
+            return record
+
+        self.misses += 1
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT state, data FROM fsm_states WHERE chat_id = %s AND user_id = %s", key
+                )
+                row = await cursor.fetchone()
+        loaded = {'state': row[0], 'data': json.loads(row[1]) if row[1] else {}} if row else copy.deepcopy(_EMPTY)
+
+        # Пока шел запрос, запись мог создать другой обработчик - его версия новее
+        record = self._records.setdefault(key, loaded)
+        self._evict()
+        return record
+
+    def _evict(self):
+        # Вытесняем только записи, уже сохраненные в базе
+        while len(self._records) > self.cache_size:
+            for key in self._records:
+                if key not in self._dirty:
+                    del self._records[key]
+                    break
+            else:
+                return
+
+    def _mark_dirty(self, chat, user):
+        self._dirty.add(self._key(chat, user))
+        self._ensure_flush_task()
+
+    def _ensure_flush_task(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Несохраненные записи остаются в _dirty и уйдут при следующей попытке
+                logger.error(f"Ошибка при сохранении состояний FSM: {e}")
+
+    async def flush(self) -> int:
+        """Записывает накопленные изменения состояний в базу данных."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            keys, self._dirty = self._dirty, set()
+            upserts, deletes = [], []
+            for key in keys:
+                record = self._records.get(key)
+                if record is None or record == _EMPTY:
+                    deletes.append(key)
+                else:
+                    upserts.append((*key, record['state'], json.dumps(record['data'], ensure_ascii=False, default=str)))
+
+            try:
+                async with self.pool.acquire() as connection:
+                    async with connection.cursor() as cursor:
+                        if upserts:
+                            await cursor.executemany(
+                                """
+                                INSERT INTO fsm_states (chat_id, user_id, state, data)
+                                VALUES (%s, %s, %s, %s)
+                                ON DUPLICATE KEY UPDATE state = VALUES(state), data = VALUES(data)
+                                """, upserts
+                            )
+                        if deletes:
+                            await cursor.executemany(
+                                "DELETE FROM fsm_states WHERE chat_id = %s AND user_id = %s", deletes
+                            )
+                        await connection.commit()
+            except Exception:
+                self._dirty |= keys
+                raise
+
+            self.flushed += len(keys)
+            return len(keys)
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        logger.info("Состояния FSM сохранены в базу данных.")
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        record = await self._record(chat, user)
+        return record['state'] if record['state'] is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        record = await self._record(chat, user)
+        return copy.deepcopy(record['data'])
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        record = await self._record(chat, user)
+        record['state'] = self.resolve_state(state)
+        self._mark_dirty(chat, user)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        record = await self._record(chat, user)
+        record['data'] = copy.deepcopy(data) if data else {}
+        self._mark_dirty(chat, user)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        record = await self._record(chat, user)
+        record['data'].update(data or {}, **kwargs)
+        self._mark_dirty(chat, user)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._records),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "flushed": self.flushed,
+        }
@@ -0,0 +1,103 @@
+import logging
+from collections import OrderedDict
+from config import USER_CACHE_SIZE
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class UserIdentityCache:
+    """
+    Двунаправленная LRU-карта tg_user_id <-> users.id.
+
+    Пара идентификаторов не меняется после регистрации, поэтому ее можно держать
+    в памяти процесса. Размер ограничен maxsize, при переполнении вытесняются
+    давно не использованные пользователи.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._by_tg_user_id = OrderedDict()
+        self._by_user_id = {}
+        self.hits = {"user_id": 0, "tg_user_id": 0}
+        self.misses = {"user_id": 0, "tg_user_id": 0}
+
+    def __len__(self):
+        return len(self._by_tg_user_id)
+
+    def get_user_id(self, tg_user_id):
+        user_id = self._by_tg_user_id.get(tg_user_id)
+        if user_id is None:
+            self.misses["user_id"] += 1
+            return None
+        self._by_tg_user_id.move_to_end(tg_user_id)
+        self.hits["user_id"] += 1
+        return user_id
+
+    def get_tg_user_id(self, user_id):
+        tg_user_id = self._by_user_id.get(user_id)
+        if tg_user_id is None:
+            self.misses["tg_user_id"] += 1
+            return None
+        self._by_tg_user_id.move_to_end(tg_user_id)
+        self.hits["tg_user_id"] += 1
+        return tg_user_id
+
+    def put(self, user_id, tg_user_id):
+        if user_id is None or tg_user_id is None:
+            return
+        previous_user_id = self._by_tg_user_id.pop(tg_user_id, None)
+        if previous_user_id is not None:
+            self._by_user_id.pop(previous_user_id, None)
+        previous_tg_user_id = self._by_user_id.pop(user_id, None)
+        if previous_tg_user_id is not None:
+            self._by_tg_user_id.pop(previous_tg_user_id, None)
+
+        self._by_tg_user_id[tg_user_id] = user_id
+        self._by_user_id[user_id] = tg_user_id
+
+        while len(self._by_tg_user_id) > self.maxsize:
+            _, evicted_user_id = self._by_tg_user_id.popitem(last=False)
+            self._by_user_id.pop(evicted_user_id, None)
+
+    def invalidate(self, tg_user_id=None, user_id=None):
+        if tg_user_id is not None:
+            user_id = self._by_tg_user_id.pop(tg_user_id, None) or user_id
+        if user_id is not None:
+            tg_user_id = self._by_user_id.pop(user_id, None)
+            if tg_user_id is not None:
+                self._by_tg_user_id.pop(tg_user_id, None)
+
+    def clear(self):
+        self._by_tg_user_id.clear()
+        self._by_user_id.clear()
+
+    async def warm(self, pool) -> int:
+        """Заполняет кеш последними зарегистрированными пользователями одним запросом."""
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT id, tg_user_id FROM users ORDER BY id DESC LIMIT %s", (self.maxsize,)
+                )
+                rows = await cursor.fetchall()
+
+        # Идем от старых к новым, чтобы самые новые пользователи вытеснялись последними
+        for user_id, tg_user_id in reversed(rows):
+            self.put(user_id, tg_user_id)
+        logger.info(f"Кеш идентификаторов пользователей прогрет: {len(rows)} записей.")
+        return len(rows)
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+user_identity_cache = UserIdentityCache()
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import random
+import time
+import aiomysql
+from config import MEAL_TEXTS_TTL
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MealTextCache:
+    """
+    Приветствия и прощания из meal_greetings в памяти процесса.
+
+    Таблица целиком читается одним запросом и раскладывается в кортежи по
+    (meal_type, greeting_type), случайный текст выбирается без обращения к базе.
+    Тексты перечитываются раз в ttl секунд или командой /reload_texts; если
+    перечитать не удалось, остаются прежние.
+    """
+
+    def __init__(self, ttl: float = MEAL_TEXTS_TTL):
+        self.ttl = ttl
+        self._texts = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return sum(len(texts) for texts in self._texts.values())
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def load(self, pool) -> int:
+        async with self._lock:
+            return await self._load(pool)
+
+    async def _load(self, pool) -> int:
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("SELECT meal_type, greeting_type, greeting_text FROM meal_greetings")
+                rows = await cursor.fetchall()
+
+        texts = {}
+        for row in rows:
+            texts.setdefault((row['meal_type'], row['greeting_type']), []).append(row['greeting_text'])
+        self._texts = {key: tuple(values) for key, values in texts.items()}
+        self._loaded_at = time.monotonic()
+        logger.info(f"Загружено приветствий и прощаний: {len(rows)}.")
+        return len(rows)
+
+    async def ensure_fresh(self, pool):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            try:
+                await self._load(pool)
+            except aiomysql.Error as err:
+                if self._loaded_at is None:
+                    raise
+                # Работаем со старыми текстами и попробуем снова через ttl
+                self._loaded_at = time.monotonic()
+                logger.error(f"Не удалось обновить приветствия, используются прежние: {err}")
+
+    async def pick(self, pool, meal_type: str, greeting_type: str):
+        await self.ensure_fresh(pool)
+        texts = self._texts.get((meal_type, greeting_type))
+        return random.choice(texts) if texts else None
+
+
+meal_texts = MealTextCache()
@@ -0,0 +1,183 @@
+import logging
+from collections import namedtuple
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateTable, CreateIndex
+from database.models import Base
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Все шарды запускаются одновременно: миграции применяет тот, кто первым взял блокировку
+MIGRATION_LOCK = "food_bot_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 300
+
+Migration = namedtuple("Migration", ("version", "description", "apply"))
+
+_dialect = mysql.dialect()
+
+
+def _ddl(element) -> str:
+    return str(element.compile(dialect=_dialect)).strip()
+
+
+async def table_exists(cursor, table: str) -> bool:
+    await cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return (await cursor.fetchone())[0] > 0
+
+
+async def column_exists(pool, table: str, column: str) -> bool:
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                SELECT COUNT(*)
+                FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+                """, (table, column)
+            )
+            return (await cursor.fetchone())[0] > 0
+
+
+async def _table_indexes(cursor, table: str) -> dict:
+    """Индексы таблицы: имя -> список столбцов по порядку."""
+    await cursor.execute(
+        """
+        SELECT index_name, column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+        """, (table,)
+    )
+    indexes = {}
+    for index_name, column_name in await cursor.fetchall():
+        indexes.setdefault(index_name, []).append(column_name)
+    return indexes
+
+
+async def ensure_index(cursor, index) -> bool:
+    """
+    Создает индекс из models.py, если его еще нет. Индекс, который уже есть
+    в базе под другим именем и начинается с тех же столбцов, тоже считается.
+    """
+    columns = [column.name for column in index.columns]
+    for name, existing in (await _table_indexes(cursor, index.table.name)).items():
+        if name == index.name or existing[:len(columns)] == columns:
+            return False
+    await cursor.execute(_ddl(CreateIndex(index)))
+    logger.info(f"Создан индекс {index.name} ({index.table.name}: {', '.join(columns)}).")
+    return True
+
+
+def _model_index(name: str):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(name)
+
+
+async def create_missing_tables(cursor):
+    """Таблицы из models.py, которых еще нет в базе, вместе с их индексами."""
+    for table in Base.metadata.sorted_tables:
+        if await table_exists(cursor, table.name):
+            continue
+        await cursor.execute(_ddl(CreateTable(table)))
+        for index in table.indexes:
+            await cursor.execute(_ddl(CreateIndex(index)))
+        logger.info(f"Создана таблица {table.name}.")
+
+
+async def add_task_change_feed(cursor):
+    """Столбец updated_at в scheduled_tasks для инкрементальной синхронизации задач (scheduler.py)."""
+    await cursor.execute(
+        """
+        SELECT COUNT(*)
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'scheduled_tasks' AND column_name = 'updated_at'
+        """
+    )
+    if not (await cursor.fetchone())[0]:
+        await cursor.execute(
+            """
+            ALTER TABLE scheduled_tasks
+                ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+            """
+        )
+        logger.info("В scheduled_tasks добавлен столбец updated_at.")
+    await ensure_index(cursor, _model_index('ix_scheduled_tasks_updated_at'))
+
+
+# Индексы запросов, которые выполняются на каждом обновлении или в каждом проходе планировщика
+HOT_PATH_INDEXES = (
+    'ix_users_tg_user_id',
+    'ix_scheduled_tasks_user_task',
+    'ix_subscriptions_user_active',
+    'ix_subscriptions_active_end',
+    'ix_user_calories_date',
+    'ix_meal_schedules_timezone',
+    'ix_recipes_meal_prep_calories',
+    'ix_meal_greetings_type',
+)
+
+
+async def add_hot_path_indexes(cursor):
+    for name in HOT_PATH_INDEXES:
+        await ensure_index(cursor, _model_index(name))
+
+
+# Каждый шаг можно безопасно повторить: DDL в MySQL не откатывается, и после
+# сбоя посередине шаг применяется заново с начала
+MIGRATIONS = (
+    Migration(1, "Таблицы, с которыми работает бот", create_missing_tables),
+    Migration(2, "updated_at в scheduled_tasks", add_task_change_feed),
+    Migration(3, "Индексы горячих запросов", add_hot_path_indexes),
+)
+
+
+async def applied_versions(cursor) -> set:
+    await cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    await cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def apply_migrations(pool) -> int:
+    """Применяет недостающие миграции по порядку версий. Возвращает количество примененных."""
+    applied = 0
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+            if not (await cursor.fetchone())[0]:
+                raise RuntimeError("Не дождались блокировки миграций схемы.")
+            try:
+                done = await applied_versions(cursor)
+                for migration in MIGRATIONS:
+                    if migration.version in done:
+                        continue
+                    logger.info(f"Миграция {migration.version}: {migration.description}")
+                    await migration.apply(cursor)
+                    await cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (migration.version, migration.description)
+                    )
+                    await connection.commit()
+                    applied += 1
+            finally:
+                await cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+                await cursor.fetchone()
+
+    if applied:
+        logger.info(f"Применено миграций схемы: {applied}.")
+    return applied
@@ -1,10 +1,114 @@
-from sqlalchemy import Column, Integer, String, Time, Boolean, create_engine
+from sqlalchemy import Column, Integer, String, Time, Boolean, Float, Numeric, Date, Index, create_engine, text
+from sqlalchemy.dialects.mysql import TIMESTAMP, BIGINT, MEDIUMTEXT, DATETIME, TEXT
+from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import get_db_config
 
 Base = declarative_base()
 
+class User(Base):
+    __tablename__ = 'users'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tg_user_id = Column(BIGINT, nullable=False)
+    username = Column(String(255), nullable=True)
+    is_registered = Column(Boolean, nullable=False, server_default=text("0"))
+    height = Column(Float, nullable=True)
+    weight = Column(Float, nullable=True)
+    gender = Column(String(20), nullable=True)
+    age = Column(Integer, nullable=True)
+    activity_level = Column(Float, nullable=True)
+    meals_per_day = Column(Integer, nullable=True)
+    calorie_norm = Column(Numeric(10, 2), nullable=True)
+    free_trial_used = Column(Boolean, nullable=False, server_default=text("0"))
+
+    __table_args__ = (
+        # Поиск по tg_user_id на каждом обновлении; is_registered отдается прямо из индекса
+        Index('ix_users_tg_user_id', 'tg_user_id', 'is_registered'),
+    )
+
+class MealSchedule(Base):
+    __tablename__ = 'meal_schedules'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False, unique=True)
+    breakfast_time = Column(Time, nullable=True)
+    lunch_time = Column(Time, nullable=True)
+    dinner_time = Column(Time, nullable=True)
+    user_timezone = Column(String(16), nullable=True)
+
+    __table_args__ = (
+        # Группировка пользователей по часовому поясу при смене суток (daily_rollover.py)
+        Index('ix_meal_schedules_timezone', 'user_timezone', 'user_id'),
+    )
+
+class Subscription(Base):
+    __tablename__ = 'subscriptions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False, unique=True)
+    start_date = Column(DATETIME, nullable=True)
+    end_date = Column(DATETIME, nullable=True)
+    is_active = Column(Boolean, nullable=False, server_default=text("0"))
+
+    __table_args__ = (
+        # Проверка подписки читает все нужные поля из индекса
+        Index('ix_subscriptions_user_active', 'user_id', 'is_active', 'end_date'),
+        # Загрузка активных подписок в кучу окончаний (deactivate_subcription.py)
+        Index('ix_subscriptions_active_end', 'is_active', 'end_date', 'user_id'),
+    )
+
+class UserCalories(Base):
+    """Счетчики текущего дня пользователя, одна строка на пользователя."""
+    __tablename__ = 'user_calories'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False, unique=True)
+    date = Column(Date, nullable=False, server_default=text("(CURRENT_DATE)"))
+    calories_consumed = Column(Float, nullable=False, server_default=text("0"))
+    breakfast_flag = Column(Boolean, nullable=False, server_default=text("0"))
+    second_breakfast_flag = Column(Boolean, nullable=False, server_default=text("0"))
+    lunch_flag = Column(Boolean, nullable=False, server_default=text("0"))
+    dinner_flag = Column(Boolean, nullable=False, server_default=text("0"))
+
+    __table_args__ = (
+        # Поиск строк со вчерашней датой при смене суток
+        Index('ix_user_calories_date', 'date'),
+    )
+
+class Recipe(Base):
+    __tablename__ = 'recipes'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    title = Column(String(255), nullable=False)
+    instructions = Column(TEXT, nullable=True)
+    ingredients = Column(TEXT, nullable=True)
+    calories = Column(Float, nullable=True)
+    protein = Column(Float, nullable=True)
+    fats = Column(Float, nullable=True)
+    carbohydrates = Column(Float, nullable=True)
+    image_url = Column(String(512), nullable=True)
+    preparation_time = Column(String(32), nullable=True)
+    meal_type = Column(String(20), nullable=True)
+
+    __table_args__ = (
+        Index('ix_recipes_meal_prep_calories', 'meal_type', 'preparation_time', 'calories'),
+    )
+
+class MealGreeting(Base):
+    """Приветствия и прощания к приемам пищи (greeting_type: greeting или farewell)."""
+    __tablename__ = 'meal_greetings'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    meal_type = Column(String(20), nullable=False)
+    greeting_type = Column(String(20), nullable=False)
+    greeting_text = Column(TEXT, nullable=False)
+
+    __table_args__ = (
+        Index('ix_meal_greetings_type', 'meal_type', 'greeting_type'),
+    )
+
 class ScheduledTask(Base):
     __tablename__ = 'scheduled_tasks'
 
@@ -14,6 +118,51 @@ class ScheduledTask(Base):
     time = Column(Time, nullable=False)
     task_type = Column(String(20), nullable=False)  # Тип задачи (например, завтрак, обед)
     is_active = Column(Boolean, default=True)  # Флаг активности задачи
+    # Время последнего изменения - по нему планировщик забирает только новые правки
+    updated_at = Column(
+        TIMESTAMP(fsp=6), nullable=False,
+        server_default=text("CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)")
+    )
+
+    __table_args__ = (
+        Index('ix_scheduled_tasks_updated_at', 'updated_at'),
+        # Поиск задачи пользователя при добавлении и обновление is_active по user_id
+        Index('ix_scheduled_tasks_user_task', 'user_id', 'task_name', 'task_type'),
+    )
+
+class TelegramFileId(Base):
+    """file_id картинок, уже загруженных в Telegram, чтобы не отправлять их повторно по URL."""
+    __tablename__ = 'telegram_file_ids'
+
+    url = Column(String(512), primary_key=True)
+    file_id = Column(String(255), nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp(),
+                        onupdate=func.current_timestamp())
+
+class FSMState(Base):
+    """Состояния FSM пользователей (MySQLStorage), чтобы диалоги переживали перезапуск бота."""
+    __tablename__ = 'fsm_states'
+
+    chat_id = Column(BIGINT, primary_key=True, autoincrement=False)
+    user_id = Column(BIGINT, primary_key=True, autoincrement=False)
+    state = Column(String(255), nullable=True)
+    data = Column(MEDIUMTEXT, nullable=True)  # JSON с данными состояния
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp(),
+                        onupdate=func.current_timestamp())
+
+class DelayedJobRecord(Base):
+    """Отложенные задачи (delayed_jobs.py), чтобы они выполнялись и после перезапуска бота."""
+    __tablename__ = 'delayed_jobs'
+
+    id = Column(BIGINT, primary_key=True, autoincrement=True)
+    job_type = Column(String(50), nullable=False)
+    tg_user_id = Column(BIGINT, nullable=True)
+    payload = Column(TEXT, nullable=True)  # JSON с аргументами обработчика
+    run_at = Column(DATETIME(fsp=6), nullable=False)  # Время запуска в UTC
+
+    __table_args__ = (
+        Index('ix_delayed_jobs_run_at', 'run_at'),
+    )
 
 def get_engine():
     """Создает и возвращает движок SQLAlchemy для подключения к базе данных."""
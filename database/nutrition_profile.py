@@ -0,0 +1,56 @@
+import decimal
+import logging
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Доля суточной нормы на один прием пищи в зависимости от количества приемов в день
+MEAL_SHARES = {
+    2: {"breakfast": 0.3, "lunch": 0.3, "dinner": 0.3},
+    3: {"breakfast": 0.33, "lunch": 0.33, "dinner": 0.33},
+}
+# На перекус всегда 33% нормы
+SNACK_SHARE = 0.33
+# Допустимое отклонение калорийности рецепта от цели
+CALORIE_TOLERANCE = 0.1
+
+
+class NutritionProfile:
+    """Норма калорий пользователя и заранее посчитанные окна калорийности для каждого приема пищи."""
+
+    __slots__ = ("user_id", "calorie_norm", "meals_per_day", "windows")
+
+    def __init__(self, user_id, calorie_norm: float, meals_per_day: int):
+        self.user_id = user_id
+        self.calorie_norm = calorie_norm
+        self.meals_per_day = meals_per_day
+
+        shares = dict(MEAL_SHARES.get(meals_per_day, {}), snack=SNACK_SHARE)
+        # meal_type -> (min_calories, max_calories)
+        self.windows = {
+            meal_type: (calorie_norm * share * (1 - CALORIE_TOLERANCE), calorie_norm * share * (1 + CALORIE_TOLERANCE))
+            for meal_type, share in shares.items()
+        }
+
+    def window(self, meal_type: str):
+        return self.windows.get(meal_type)
+
+
+def build_profile(user_id, calorie_norm, meals_per_day):
+    """Строит профиль из значений таблицы users, None - если данных недостаточно."""
+    if calorie_norm is None:
+        logger.warning(f"Не найдена норма калорий для пользователя с id {user_id}.")
+        return None
+    if isinstance(calorie_norm, decimal.Decimal):
+        calorie_norm = float(calorie_norm)
+    try:
+        meals_per_day = int(meals_per_day)
+    except (TypeError, ValueError):
+        logger.error(f"Не удалось преобразовать количество приемов пищи в число: {meals_per_day}")
+        return None
+    if meals_per_day <= 0:
+        logger.error(f"Количество приемов пищи должно быть положительным числом, но получено: {meals_per_day}")
+        return None
+    return NutritionProfile(user_id, calorie_norm, meals_per_day)
+
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+import pytz
+from config import DB_POOL_MIN, DB_POOL_ACQUIRE_TIMEOUT, DB_POOL_IDLE_SECONDS, NOTIFICATION_CONCURRENCY
+from outbound_queue import LatencyHistogram
+from notification_dispatcher import minute_of_day
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _ManagedConnection:
+    """acquire() управляемого пула: работает и как async with, и как await (см. RequestSession)."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.connection = None
+
+    def __await__(self):
+        return self.pool.acquire_connection().__await__()
+
+    async def __aenter__(self):
+        self.connection = await self.pool.acquire_connection()
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.pool.release(self.connection)
+
+
+class ManagedPool:
+    """
+    Обертка над aiomysql.Pool с метриками, прогревом и освобождением простаивающих соединений.
+
+    Считает время ожидания соединения, занятые соединения и таймауты, чтобы
+    размеры пула можно было подбирать по данным. Перед рассылкой уведомлений
+    пул заранее открывает нужное число соединений, а после пика лишние
+    простаивающие соединения закрываются до minsize.
+    """
+
+    def __init__(self, pool, acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT,
+                 idle_seconds: float = DB_POOL_IDLE_SECONDS):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.idle_seconds = idle_seconds
+        self.wait = LatencyHistogram()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.timeouts = 0
+        self.prewarmed = 0
+        self.reaped = 0
+
+    def acquire(self):
+        return _ManagedConnection(self)
+
+    async def acquire_connection(self):
+        started = time.monotonic()
+        try:
+            connection = await asyncio.wait_for(self.pool.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"Не дождались соединения с базой за {self.acquire_timeout} с "
+                         f"(занято {self.in_use} из {self.pool.maxsize}).")
+            raise
+        self.wait.observe(time.monotonic() - started)
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        return connection
+
+    def release(self, connection):
+        self.in_use -= 1
+        return self.pool.release(connection)
+
+    async def prewarm(self, target: int) -> int:
+        """Открывает соединения, пока в пуле их не станет target (но не больше maxsize)."""
+        target = min(target, self.pool.maxsize)
+        if self.pool.size >= target:
+            return 0
+        # Забираем все свободные соединения и недостающие новые, затем сразу возвращаем их в пул
+        size_before = self.pool.size
+        needed = target - (size_before - self.pool.freesize)
+        connections = await asyncio.gather(*(self.pool.acquire() for _ in range(needed)), return_exceptions=True)
+        for connection in connections:
+            if isinstance(connection, BaseException):
+                logger.error(f"Не удалось открыть соединение при прогреве пула: {connection}")
+                continue
+            self.pool.release(connection)
+        opened = max(self.pool.size - size_before, 0)
+        self.prewarmed += opened
+        logger.info(f"Пул соединений прогрет: {self.pool.size} соединений.")
+        return opened
+
+    def reap_idle(self) -> int:
+        """Закрывает свободные соединения, простаивающие дольше idle_seconds, оставляя minsize."""
+        # У aiomysql нет публичного API для этого: работаем со списком свободных соединений пула
+        free = self.pool._free
+        now = asyncio.get_running_loop().time()
+        reaped = 0
+        for _ in range(len(free)):
+            if self.pool.size <= self.pool.minsize:
+                break
+            connection = free.popleft()
+            if now - connection.last_usage > self.idle_seconds:
+                connection.close()
+                reaped += 1
+            else:
+                free.append(connection)
+        self.reaped += reaped
+        if reaped:
+            logger.info(f"Закрыто простаивающих соединений: {reaped}, в пуле осталось {self.pool.size}.")
+        return reaped
+
+    def stats(self) -> dict:
+        return {
+            "size": self.pool.size,
+            "free": self.pool.freesize,
+            "minsize": self.pool.minsize,
+            "maxsize": self.pool.maxsize,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "timeouts": self.timeouts,
+            "wait": self.wait.summary(),
+            "prewarmed": self.prewarmed,
+            "reaped": self.reaped,
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+async def maintain_pool(pool: ManagedPool, dispatcher, now: datetime = None):
+    """
+    Раз в минуту: если в следующую минуту много уведомлений, заранее открываем
+    соединения под их параллельность, иначе закрываем простаивающие.
+    """
+    now = now or datetime.now(pytz.utc)
+    upcoming = len(dispatcher.due(minute_of_day(now + timedelta(minutes=1))))
+    target = min(upcoming, NOTIFICATION_CONCURRENCY)
+    if target > DB_POOL_MIN:
+        await pool.prewarm(target)
+    else:
+        pool.reap_idle()
+
@@ -0,0 +1,110 @@
+"""
+Проверка планов горячих запросов через EXPLAIN.
+
+Запуск против базы из .env (лучше с данными, близкими к боевым):
+    python -m database.query_plans
+
+Завершается с кодом 1, если хотя бы один запрос читает таблицу или индекс
+целиком (type = ALL или index). Маленькие таблицы MySQL сканирует целиком
+и при наличии индекса, поэтому они только выводятся в отчете (--min-rows).
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date
+import aiomysql
+from config import get_db_config
+from database.entitlement_cache import ENTITLEMENT_QUERY
+from database.user_profile import PROFILE_QUERY
+
+# Оценка строк, начиная с которой полное сканирование считается ошибкой
+MIN_TABLE_ROWS = 100
+# Типы доступа EXPLAIN, при которых читается вся таблица или весь индекс
+FULL_SCAN_TYPES = ("ALL", "index")
+
+# Запросы, для которых полное сканирование индекса допустимо (название -> почему)
+ACCEPTED_SCANS = {
+    # shard_condition: шарду нужна 1/N всех пользователей, MOD по tg_user_id индексом не ищется.
+    # Читается только покрывающий индекс ix_users_tg_user_id (без строк таблицы) и только
+    # в фоновых задачах шарда, не в обработке обновлений; при одном процессе условия нет вовсе.
+    "Пользователи шарда": "MOD(tg_user_id, N) выбирает 1/N пользователей, читается только индекс",
+}
+
+# (название, запрос, параметры): параметры только для построения плана
+HOT_QUERIES = (
+    ("Регистрация по tg_user_id", "SELECT is_registered FROM users WHERE tg_user_id = %s", (1,)),
+    ("Профиль пользователя", PROFILE_QUERY, (1,)),
+    ("Проверка подписки", ENTITLEMENT_QUERY, (1,)),
+    ("Пользователи шарда", "SELECT id FROM users WHERE MOD(tg_user_id, %s) = %s", (2, 0)),
+    ("Поиск задачи пользователя",
+     "SELECT * FROM scheduled_tasks WHERE user_id = %s AND task_name = %s AND task_type = %s",
+     (1, "breakfast_notification_1", "breakfast")),
+    ("Изменения задач", "SELECT user_id, task_type, time, is_active FROM scheduled_tasks WHERE updated_at >= %s",
+     (date.today(),)),
+    ("Активные подписки", "SELECT user_id, end_date FROM subscriptions WHERE is_active = TRUE", ()),
+    ("Истекшие подписки",
+     "SELECT user_id FROM subscriptions WHERE user_id IN (%s, %s) AND is_active = TRUE AND end_date <= NOW()",
+     (1, 2)),
+    ("Счетчики дня", "SELECT breakfast_flag, lunch_flag, dinner_flag FROM user_calories WHERE user_id = %s AND date = %s",
+     (1, date.today())),
+    ("Смена суток", "SELECT user_id FROM user_calories WHERE date < %s", (date(2000, 1, 1),)),
+    ("Пользователи часового пояса", "SELECT user_id FROM meal_schedules WHERE user_timezone IN (%s)", ("UTC+3",)),
+    ("Рецепты по калорийности",
+     "SELECT id FROM recipes WHERE meal_type = %s AND preparation_time = %s AND calories BETWEEN %s AND %s",
+     ("lunch", "up_to_30_minutes", 400, 600)),
+    ("Приветствия", "SELECT greeting_text FROM meal_greetings WHERE meal_type = %s AND greeting_type = %s",
+     ("breakfast", "greeting")),
+)
+
+
+def full_scans(plan, min_rows: int):
+    """Строки плана с полным сканированием: (таблица, тип доступа, оценка строк, считается ли ошибкой)."""
+    for row in plan:
+        if row.get('type') in FULL_SCAN_TYPES:
+            rows = row.get('rows') or 0
+            yield row.get('table'), row['type'], rows, rows >= min_rows
+
+
+async def check_plans(min_rows: int) -> int:
+    config = get_db_config()
+    connection = await aiomysql.connect(host=config['host'], port=config['port'], user=config['user'],
+                                        password=config['password'], db=config['database'])
+    failures = 0
+    try:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            for name, query, params in HOT_QUERIES:
+                await cursor.execute(f"EXPLAIN {query}", params)
+                plan = await cursor.fetchall()
+                keys = ", ".join(f"{row['table']}:{row['key'] or '-'}" for row in plan)
+                scans = list(full_scans(plan, min_rows))
+                accepted = ACCEPTED_SCANS.get(name)
+                failed = not accepted and any(fatal for *_, fatal in scans)
+                failures += failed
+                status = "FAIL" if failed else "ok"
+                print(f"[{status:>4}] {name}: {keys}")
+                for table, scan_type, rows, fatal in scans:
+                    if accepted:
+                        note = f" (допустимо: {accepted})"
+                    else:
+                        note = "" if fatal else " (мало строк, не ошибка)"
+                    print(f"         полное сканирование {table} ({scan_type}), ~{rows} строк{note}")
+    finally:
+        connection.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-rows", type=int, default=MIN_TABLE_ROWS,
+                        help="с какой оценки строк полное сканирование считается ошибкой")
+    args = parser.parse_args()
+
+    failures = asyncio.run(check_plans(args.min_rows))
+    if failures:
+        print(f"Запросов с полным сканированием: {failures}")
+        sys.exit(1)
+    print("Все горячие запросы используют индексы.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import asyncio
+import bisect
+import logging
+import math
+import random
+import time
+from array import array
+from collections import OrderedDict
+import aiomysql
+from config import RECIPE_CATALOG_TTL
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Наборы перекусов: до 3 рецептов, окна калорийности округляются до шага, чтобы пользователи делили кеш
+MAX_BUNDLE_SIZE = 3
+BUNDLE_BAND_STEP = 10
+BUNDLE_BAND_CACHE_SIZE = 256
+
+RECIPE_COLUMNS = (
+    "id, title, instructions, ingredients, calories, protein, fats, carbohydrates, "
+    "image_url, preparation_time, meal_type"
+)
+
+
+def _calories_key(recipe):
+    calories = recipe.get('calories')
+    return float(calories) if calories is not None else None
+
+
+class SnackBundles:
+    """
+    Наборы из 1-3 разных перекусов с суммарной калорийностью в заданном окне.
+
+    Для каждого окна наборы считаются один раз (ограниченный перебор subset-sum по
+    отсортированным калориям) и хранятся компактно: фиксированные рецепты плюс
+    диапазон индексов последнего рецепта. Случайный набор выбирается равномерно
+    одним случайным числом и bisect по накопленным количествам.
+    """
+
+    def __init__(self, recipes):
+        self.recipes = sorted(recipes, key=_calories_key)
+        self.calories = [_calories_key(recipe) for recipe in self.recipes]
+        # (min, max) -> (накопленные количества, сегменты (фиксированные индексы, начало диапазона))
+        self._bands = OrderedDict()
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def _segments(self, min_calories, max_calories):
+        calories = self.calories
+        limit = bisect.bisect_right(calories, max_calories)
+        segments = []
+
+        def add_range(fixed, low, high, start):
+            # Последний рецепт набора - индексы с калориями в [low, high], не раньше start
+            begin = bisect.bisect_left(calories, low, start, limit)
+            end = bisect.bisect_right(calories, high, begin, limit)
+            if end > begin:
+                segments.append((fixed, begin, end))
+
+        add_range((), min_calories, max_calories, 0)
+        for first in range(limit):
+            spent = calories[first]
+            if MAX_BUNDLE_SIZE >= 2:
+                add_range((first,), min_calories - spent, max_calories - spent, first + 1)
+            if MAX_BUNDLE_SIZE >= 3:
+                for second in range(first + 1, limit):
+                    pair = spent + calories[second]
+                    if pair + calories[second] > max_calories:
+                        break
+                    add_range((first, second), min_calories - pair, max_calories - pair, second + 1)
+        return segments
+
+    def _band(self, min_calories, max_calories):
+        key = (min_calories, max_calories)
+        band = self._bands.get(key)
+        if band is not None:
+            self._bands.move_to_end(key)
+            return band
+
+        segments = self._segments(min_calories, max_calories)
+        totals = []
+        total = 0
+        for _, begin, end in segments:
+            total += end - begin
+            totals.append(total)
+        band = self._bands[key] = (totals, segments)
+        while len(self._bands) > BUNDLE_BAND_CACHE_SIZE:
+            self._bands.popitem(last=False)
+        return band
+
+    def count(self, min_calories, max_calories) -> int:
+        totals, _ = self._band(*_round_band(min_calories, max_calories))
+        return totals[-1] if totals else 0
+
+    def sample(self, min_calories, max_calories, count: int = 1):
+        """До count разных случайных наборов (списков рецептов) с суммой калорий в окне."""
+        totals, segments = self._band(*_round_band(min_calories, max_calories))
+        if not totals:
+            return []
+
+        bundles = []
+        for position in random.sample(range(totals[-1]), min(count, totals[-1])):
+            segment = bisect.bisect_right(totals, position)
+            fixed, begin, _ = segments[segment]
+            offset = position - (totals[segment - 1] if segment else 0)
+            bundles.append([self.recipes[index] for index in (*fixed, begin + offset)])
+        return bundles
+
+
+def _round_band(min_calories, max_calories):
+    """Сужает окно до шага BUNDLE_BAND_STEP, если после этого оно не пустое."""
+    low = math.ceil(min_calories / BUNDLE_BAND_STEP) * BUNDLE_BAND_STEP
+    high = math.floor(max_calories / BUNDLE_BAND_STEP) * BUNDLE_BAND_STEP
+    if low > high:
+        return min_calories, max_calories
+    return low, high
+
+
+async def _reload(cache, pool, name: str):
+    """Перечитывает устаревший кеш рецептов; если не вышло, работает со старыми данными до следующего ttl."""
+    try:
+        await cache._load(pool)
+    except aiomysql.Error as err:
+        if not cache.is_loaded:
+            raise
+        cache._loaded_at = time.time()
+        logger.error(f"Не удалось обновить {name}, используются прежние данные: {err}")
+
+
+class RecipeCatalog:
+    """
+    Процессный каталог рецептов.
+
+    Рецепты индексируются по (meal_type, preparation_time), внутри каждой группы
+    отсортированы по калориям, поэтому диапазон калорий выбирается через bisect.
+    Таблица recipes меняется редко: каталог загружается при старте и перечитывается
+    раз в ttl секунд; после правки рецептов его можно обновить сразу через
+    refresh() или invalidate() (только в текущем процессе, другие шарды - по ttl).
+    """
+
+    def __init__(self, ttl: float = RECIPE_CATALOG_TTL):
+        self.ttl = ttl
+        # (meal_type, preparation_time) -> (отсортированные калории, рецепты в том же порядке)
+        self._buckets = {}
+        # meal_type -> список времен приготовления, для которых есть рецепты
+        self._prep_times = {}
+        self._by_id = {}
+        # Наборы перекусов для подбора по калориям (перекусы при любом времени приготовления)
+        self.snack_bundles = SnackBundles([])
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.time() - self._loaded_at < self.ttl
+
+    def __len__(self):
+        return len(self._by_id)
+
+    async def load(self, pool) -> int:
+        """Загружает все рецепты из базы данных и перестраивает индекс."""
+        async with self._lock:
+            return await self._load(pool)
+
+    async def ensure_loaded(self, pool):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            # Пока мы ждали блокировку, каталог мог загрузить другой обработчик
+            if not self._is_fresh():
+                await _reload(self, pool, "каталог рецептов")
+
+    async def _load(self, pool) -> int:
+        started = time.monotonic()
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(f"SELECT {RECIPE_COLUMNS} FROM recipes")
+                rows = await cursor.fetchall()
+
+        self._build(rows)
+        logger.info(f"Каталог рецептов загружен: {len(rows)} рецептов "
+                    f"за {(time.monotonic() - started) * 1000:.1f} мс.")
+        return len(rows)
+
+    async def refresh(self, pool) -> int:
+        """Принудительно перечитывает таблицу recipes (например, после правки рецептов админом)."""
+        return await self.load(pool)
+
+    def invalidate(self):
+        """Помечает каталог устаревшим: следующий запрос перечитает таблицу recipes."""
+        self._loaded_at = None
+        logger.info("Каталог рецептов помечен как устаревший.")
+
+    def _build(self, rows):
+        groups = {}
+        by_id = {}
+        for row in rows:
+            by_id[row['id']] = row
+            if _calories_key(row) is None:
+                continue
+            groups.setdefault((row['meal_type'], row['preparation_time']), []).append(row)
+
+        buckets = {}
+        prep_times = {}
+        for (meal_type, prep_time), recipes in groups.items():
+            recipes.sort(key=_calories_key)
+            buckets[(meal_type, prep_time)] = ([_calories_key(recipe) for recipe in recipes], recipes)
+            prep_times.setdefault(meal_type, []).append(prep_time)
+
+        # Подменяем индекс целиком, чтобы параллельные читатели не видели частично построенные данные
+        self._buckets = buckets
+        self._prep_times = prep_times
+        self._by_id = by_id
+        self.snack_bundles = SnackBundles(
+            recipe for (meal_type, _), recipes in groups.items() if meal_type == "snack" for recipe in recipes
+        )
+        self._loaded_at = time.time()
+
+    def _bucket_keys(self, meal_type, prep_times):
+        if prep_times:
+            return [(meal_type, prep_time) for prep_time in prep_times]
+        return [(meal_type, prep_time) for prep_time in self._prep_times.get(meal_type, [])]
+
+    def find(self, meal_type, prep_times, min_calories, max_calories):
+        """Рецепты с калорийностью в диапазоне [min_calories, max_calories]."""
+        recipes = []
+        for key in self._bucket_keys(meal_type, prep_times):
+            bucket = self._buckets.get(key)
+            if not bucket:
+                continue
+            calories, bucket_recipes = bucket
+            start = bisect.bisect_left(calories, min_calories)
+            end = bisect.bisect_right(calories, max_calories)
+            recipes.extend(bucket_recipes[start:end])
+        return recipes
+
+    def find_up_to(self, meal_type, max_calories):
+        """Рецепты данного типа с калорийностью не выше max_calories при любом времени приготовления."""
+        recipes = []
+        for key in self._bucket_keys(meal_type, None):
+            calories, bucket_recipes = self._buckets[key]
+            recipes.extend(bucket_recipes[:bisect.bisect_right(calories, max_calories)])
+        return recipes
+
+    def image_urls(self):
+        return [recipe['image_url'] for recipe in self._by_id.values() if recipe.get('image_url')]
+
+    def get(self, recipe_id):
+        try:
+            return self._by_id.get(int(recipe_id))
+        except (TypeError, ValueError):
+            return None
+
+
+def fallback_prep_times(preparation_time):
+    """
+    Времена приготовления, подходящие под выбранное пользователем.
+
+    Повторяет условие get_recipes: точное совпадение, '30_to_60_minutes' для
+    долгих вариантов и 'more_than_60_minutes' всегда.
+    """
+    prep_times = [preparation_time]
+    if preparation_time in ('30_to_60_minutes', 'more_than_60_minutes'):
+        prep_times.append('30_to_60_minutes')
+    prep_times.append('more_than_60_minutes')
+    return list(dict.fromkeys(prep_times))
+
+
+class RecipeIdSampler:
+    """
+    Случайная выборка рецептов без ORDER BY RAND().
+
+    Хранит только id рецептов в компактных массивах по (meal_type, preparation_time):
+    выборка k рецептов стоит O(k) независимо от размера таблицы, а сами строки
+    затем читаются по первичному ключу.
+    """
+
+    def __init__(self, ttl: float = RECIPE_CATALOG_TTL):
+        self.ttl = ttl
+        self._ids = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.time() - self._loaded_at < self.ttl
+
+    async def load(self, pool) -> int:
+        async with self._lock:
+            return await self._load(pool)
+
+    async def ensure_loaded(self, pool):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if not self._is_fresh():
+                await _reload(self, pool, "индекс id рецептов")
+
+    async def _load(self, pool) -> int:
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT id, meal_type, preparation_time FROM recipes")
+                rows = await cursor.fetchall()
+
+        self._build(rows)
+        logger.info(f"Индекс id рецептов загружен: {len(rows)} рецептов.")
+        return len(rows)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _build(self, rows):
+        ids = {}
+        for recipe_id, meal_type, prep_time in rows:
+            bucket = ids.get((meal_type, prep_time))
+            if bucket is None:
+                bucket = ids[(meal_type, prep_time)] = array('q')
+            bucket.append(recipe_id)
+        self._ids = ids
+        self._loaded_at = time.time()
+
+    def sample(self, meal_type, preparation_time, k):
+        """Возвращает до k случайных различных id рецептов с учетом запасных времен приготовления."""
+        buckets = [self._ids[key] for key in
+                   ((meal_type, prep_time) for prep_time in fallback_prep_times(preparation_time))
+                   if key in self._ids]
+        total = sum(len(bucket) for bucket in buckets)
+        if not total:
+            return []
+
+        sampled = []
+        for position in random.sample(range(total), min(k, total)):
+            for bucket in buckets:
+                if position < len(bucket):
+                    sampled.append(bucket[position])
+                    break
+                position -= len(bucket)
+        return sampled
+
+
+recipe_catalog = RecipeCatalog()
+recipe_id_sampler = RecipeIdSampler()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram import types
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сессия обработки текущего обновления (None вне обработчиков)
+current_session = ContextVar("current_session", default=None)
+
+
+class RequestSession:
+    """
+    Общее соединение пула для вложенных запросов при обработке обновления.
+
+    Соединение берется из пула внешним async with pool.acquire() и возвращается,
+    как только этот блок закончился, так что ожидание Telegram и другие паузы
+    обработчика соединение не занимают. Вложенные acquire() в той же задаче
+    получают то же соединение, запросы других задач, унаследовавших контекст,
+    ждут, пока оно освободится.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.connection = None
+        self.closed = False
+        self.queries = 0
+        self._lock = asyncio.Lock()
+        self._owner = None
+        self._depth = 0
+
+    async def _enter(self):
+        task = asyncio.current_task()
+        if self._owner is not task:
+            await self._lock.acquire()
+            self._owner = task
+        self._depth += 1
+        if self.connection is None:
+            try:
+                self.connection = await self.pool.acquire()
+            except BaseException:
+                # Например, таймаут ожидания пула: блокировка не должна остаться занятой
+                self._leave()
+                raise
+        self.queries += 1
+        return self.connection
+
+    def _leave(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            self._lock.release()
+
+    async def _exit(self):
+        try:
+            if self._depth == 1 and self.connection is not None:
+                # Внешний блок закончился: соединение возвращаем в пул до снятия блокировки
+                await self._return_connection()
+        finally:
+            self._leave()
+
+    async def _return_connection(self):
+        connection, self.connection = self.connection, None
+        try:
+            if connection.get_transaction_status():
+                # Незакоммиченное в блоке отбрасываем, как и обычный пул (он закрыл бы такое соединение)
+                await connection.rollback()
+        except Exception as e:
+            logger.error(f"Не удалось откатить транзакцию сессии: {e}")
+            connection.close()
+        finally:
+            self.pool.release(connection)
+
+    async def close(self):
+        self.closed = True
+        # Соединение, которое еще использует другая задача, вернет ее внешний блок
+        if self.connection is not None and self._depth == 0:
+            await self._return_connection()
+
+
+class _SessionConnection:
+    def __init__(self, session: RequestSession):
+        self.session = session
+
+    async def __aenter__(self):
+        return await self.session._enter()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session._exit()
+
+
+class SessionPool:
+    """
+    Обертка над aiomysql.Pool: внутри обработки обновления acquire() отдает
+    соединение сессии, вне ее (планировщик, фоновые задачи) - обычное соединение пула.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.sessions = 0
+        self.shared_queries = 0
+
+    def acquire(self):
+        session = current_session.get()
+        if session is None or session.closed:
+            return self.pool.acquire()
+        return _SessionConnection(session)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+class DBSessionMiddleware(BaseMiddleware):
+    """Открывает сессию базы данных на время обработки каждого обновления."""
+
+    def __init__(self, pool: SessionPool):
+        super().__init__()
+        self.pool = pool
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        session = RequestSession(self.pool.pool)
+        data['db_session'] = session
+        data['db_session_token'] = current_session.set(session)
+
+    async def on_post_process_update(self, update: types.Update, results, data: dict):
+        session = data.pop('db_session', None)
+        token = data.pop('db_session_token', None)
+        if token is not None:
+            current_session.reset(token)
+        if session is not None:
+            self.pool.sessions += 1
+            self.pool.shared_queries += session.queries
+            await session.close()
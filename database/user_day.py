@@ -0,0 +1,47 @@
+import logging
+import re
+from datetime import datetime, timedelta
+import aiomysql
+import pytz
+from database.user_profile import user_profiles
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Часовой пояс пользователей, которые его еще не выбрали (московское время)
+DEFAULT_UTC_OFFSET_MINUTES = 180
+
+_OFFSET_RE = re.compile(r"^(?:UTC)?([+-])(\d{1,2})(?::?(\d{2}))?$")
+
+
+def parse_utc_offset(user_timezone):
+    """Смещение от UTC в минутах для значений вида 'UTC+3', '+07:00'; None, если разобрать не удалось."""
+    if not user_timezone:
+        return None
+    match = _OFFSET_RE.match(str(user_timezone).strip())
+    if not match:
+        return None
+    sign, hours, minutes = match.groups()
+    offset = int(hours) * 60 + int(minutes or 0)
+    return -offset if sign == '-' else offset
+
+
+def local_date(offset_minutes: int, now: datetime = None):
+    """Текущая дата в часовом поясе со смещением offset_minutes."""
+    now = now or datetime.now(pytz.utc)
+    return (now + timedelta(minutes=offset_minutes)).date()
+
+
+async def user_today(pool, user_id):
+    """Сегодняшняя дата в часовом поясе пользователя (пояс берется из кешированного профиля)."""
+    try:
+        profile = await user_profiles.get(pool, user_id)
+    except aiomysql.Error as err:
+        logger.error(f"Ошибка при получении часового пояса пользователя {user_id}: {err}")
+        profile = None
+
+    offset = parse_utc_offset(profile.user_timezone) if profile else None
+    if offset is None:
+        offset = DEFAULT_UTC_OFFSET_MINUTES
+    return local_date(offset)
@@ -0,0 +1,109 @@
+import logging
+import time
+from collections import OrderedDict
+import aiomysql
+from config import USER_CACHE_SIZE
+from database.nutrition_profile import build_profile
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Страховочный срок жизни профиля (на случай ручных правок в базе)
+PROFILE_TTL_SECONDS = 3600
+
+_UNSET = object()
+
+PROFILE_QUERY = """
+    SELECT u.id, u.tg_user_id, u.is_registered, u.calorie_norm, u.meals_per_day,
+           ms.user_id AS schedule_user_id, ms.user_timezone,
+           s.is_active AS subscription_active, s.end_date AS subscription_end
+    FROM users u
+    LEFT JOIN meal_schedules ms ON ms.user_id = u.id
+    LEFT JOIN subscriptions s ON s.user_id = u.id
+    WHERE u.id = %s
+    LIMIT 1
+"""
+
+
+class UserProfile:
+    """Данные пользователя из users, meal_schedules и subscriptions, прочитанные одним запросом."""
+
+    __slots__ = ("user_id", "tg_user_id", "is_registered", "calorie_norm", "meals_per_day", "has_meal_schedule",
+                 "user_timezone", "subscription_active", "subscription_end", "loaded_at", "_nutrition")
+
+    def __init__(self, row: dict):
+        self.user_id = row['id']
+        self.tg_user_id = row['tg_user_id']
+        self.is_registered = bool(row['is_registered'])
+        # Значения как в таблице: старые геттеры возвращали их без преобразований
+        self.calorie_norm = row['calorie_norm']
+        self.meals_per_day = row['meals_per_day']
+        self.has_meal_schedule = row['schedule_user_id'] is not None
+        self.user_timezone = row['user_timezone']
+        self.subscription_active = bool(row['subscription_active'])
+        self.subscription_end = row['subscription_end']
+        self.loaded_at = time.monotonic()
+        self._nutrition = _UNSET
+
+    @property
+    def nutrition(self):
+        """Окна калорийности по приемам пищи (см. nutrition_profile.py), None - если анкета не заполнена."""
+        if self._nutrition is _UNSET:
+            self._nutrition = build_profile(self.user_id, self.calorie_norm, self.meals_per_day)
+        return self._nutrition
+
+
+class UserProfileCache:
+    """
+    LRU-кеш профилей пользователей, ключ - users.id.
+
+    Все, кто меняет users, meal_schedules или subscriptions, сбрасывают профиль
+    через invalidate() сразу после commit, следующее чтение загрузит его заново.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = PROFILE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._profiles = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._profiles)
+
+    async def get(self, pool, user_id):
+        profile = self._profiles.get(user_id)
+        if profile is not None and time.monotonic() - profile.loaded_at < self.ttl:
+            self._profiles.move_to_end(user_id)
+            self.hits += 1
+            return profile
+
+        self.misses += 1
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(PROFILE_QUERY, (user_id,))
+                row = await cursor.fetchone()
+
+        if not row:
+            self._profiles.pop(user_id, None)
+            logger.warning(f"Пользователь с id {user_id} не найден.")
+            return None
+        profile = self._profiles[user_id] = UserProfile(row)
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+        return profile
+
+    def invalidate(self, user_id):
+        self._profiles.pop(user_id, None)
+
+    def invalidate_users(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def stats(self) -> dict:
+        return {"size": len(self._profiles), "hits": self.hits, "misses": self.misses}
+
+
+user_profiles = UserProfileCache()
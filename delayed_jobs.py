@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from aiomysql import DictCursor
+from context import AppContext
+from outbound_queue import BROADCAST, send_priority
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def to_db_time(timestamp: float) -> datetime:
+    # В базе время хранится в UTC без часового пояса
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None)
+
+
+def from_db_time(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class DelayedJob:
+    __slots__ = ("job_id", "job_type", "tg_user_id", "payload")
+
+    def __init__(self, job_id, job_type, tg_user_id, payload):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.tg_user_id = tg_user_id
+        self.payload = payload
+
+
+class DelayedJobQueue:
+    """
+    Отложенные задачи ("написать пользователю через 3 минуты") без asyncio.sleep в обработчиках.
+
+    Задача сохраняется в таблицу delayed_jobs и кладется в кучу по времени запуска.
+    Одна фоновая задача ждет ближайший срок и запускает обработчик по job_type.
+    После перезапуска бота несработавшие задачи читаются из таблицы, а просроченные
+    выполняются сразу. Строка удаляется после выполнения.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self._running = set()
+        self.executed = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def register(self, job_type: str, handler):
+        """handler(context, tg_user_id, **payload) вызывается, когда подходит срок задачи."""
+        self.handlers[job_type] = handler
+
+    def _push(self, run_at: float, job: DelayedJob):
+        heapq.heappush(self._heap, (run_at, next(self._sequence), job))
+        self._wakeup.set()
+
+    async def schedule(self, context: AppContext, job_type: str, delay_seconds: float, tg_user_id=None, **payload):
+        run_at = time.time() + delay_seconds
+        job_id = None
+        try:
+            async with context.pool.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        "INSERT INTO delayed_jobs (job_type, tg_user_id, payload, run_at) VALUES (%s, %s, %s, %s)",
+                        (job_type, tg_user_id, json.dumps(payload), to_db_time(run_at))
+                    )
+                    job_id = cursor.lastrowid
+                    await connection.commit()
+        except Exception as e:
+            # Задача все равно выполнится, но не переживет перезапуск
+            logger.error(f"Не удалось сохранить отложенную задачу {job_type}: {e}")
+        self._push(run_at, DelayedJob(job_id, job_type, tg_user_id, payload))
+
+    async def load(self, context: AppContext) -> int:
+        condition, params = "TRUE", ()
+        if context.shard_count > 1:
+            # Задачи без пользователя выполняет первый шард
+            condition, params = "MOD(COALESCE(tg_user_id, 0), %s) = %s", (context.shard_count, context.shard_id)
+        async with context.pool.acquire() as connection:
+            async with connection.cursor(DictCursor) as cursor:
+                await cursor.execute(
+                    f"SELECT id, job_type, tg_user_id, payload, run_at FROM delayed_jobs WHERE {condition}", params
+                )
+                rows = await cursor.fetchall()
+
+        known = {job.job_id for _, _, job in self._heap}
+        for row in rows:
+            if row['id'] in known:
+                continue
+            payload = json.loads(row['payload']) if row['payload'] else {}
+            self._push(from_db_time(row['run_at']), DelayedJob(row['id'], row['job_type'], row['tg_user_id'], payload))
+        logger.info(f"Загружено отложенных задач: {len(rows)}.")
+        return len(rows)
+
+    def start(self, context: AppContext):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run(context))
+
+    async def _run(self, context: AppContext):
+        while True:
+            self._wakeup.clear()
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job = heapq.heappop(self._heap)
+            task = asyncio.create_task(self._execute(context, job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, context: AppContext, job: DelayedJob):
+        handler = self.handlers.get(job.job_type)
+        if handler is None:
+            logger.warning(f"Нет обработчика для отложенной задачи {job.job_type}.")
+        else:
+            # Отложенные сообщения не должны обгонять ответы пользователям
+            send_priority.set(BROADCAST)
+            try:
+                await handler(context, job.tg_user_id, **job.payload)
+                self.executed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка в отложенной задаче {job.job_type} (id {job.job_id}): {e}")
+
+        if job.job_id is not None:
+            try:
+                async with context.pool.acquire() as connection:
+                    async with connection.cursor() as cursor:
+                        await cursor.execute("DELETE FROM delayed_jobs WHERE id = %s", (job.job_id,))
+                        await connection.commit()
+            except Exception as e:
+                logger.error(f"Не удалось удалить отложенную задачу {job.job_id}: {e}")
+
+    async def close(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+    def stats(self) -> dict:
+        return {"pending": len(self), "executed": self.executed, "failed": self.failed}
+
+
+delayed_jobs = DelayedJobQueue()
@@ -6,19 +6,20 @@ from handlers.change_data_handler import register_change_data_handlers
 from menu.menu_messages import register_menu_messages_handlers
 from middlewares.subscription import SubscriptionMiddleware
 from handlers.meal_schedule_handler import register_meal_schedule_handlers
-from handlers.eat_handler.breakfast_handlers import register_breakfast_handlers
-from handlers.eat_handler.lunch_handlers import register_lunch_handlers
-from handlers.eat_handler.dinner_handlers import register_dinner_handlers
+from handlers.eat_handler import breakfast_handlers, lunch_handlers, dinner_handlers, snack_handler
+from handlers.eat_handler.meal_flow import register_meal_flow_handlers
 from context import AppContext
 from middlewares.access_control_middleware import register_handlers_with_middleware
 from payments import register_payment_handlers
-from handlers.eat_handler.snack_handler import register_snack_handlers
 from database.function import register_handlers_function
+from handlers.admin import register_admin_handlers
+from callback_router import callback_router
 
 
 def register_handlers(context: AppContext):
     dp = context.dispatcher
     pool =context.pool
+    register_admin_handlers(context)
     register_start_handler(context)
     register_contact_handler(context)
     register_user_data_handlers(context)
@@ -28,14 +29,15 @@ def register_handlers(context: AppContext):
     dp.middleware.setup(SubscriptionMiddleware(dp, pool))
 
     register_meal_schedule_handlers(context)
-    register_breakfast_handlers(context)
-    register_lunch_handlers(context)
-    register_dinner_handlers(context)
+    # Завтрак, обед, ужин и перекус добавляют свои маршруты в общую таблицу при импорте
+    register_meal_flow_handlers(context)
     register_payment_handlers(context)
-    register_snack_handlers(context)
 
     register_handlers_with_middleware(context)
 
     register_payment_handlers(context)
 
-    register_handlers_function(context)
\ No newline at end of file
+    register_handlers_function(context)
+
+    # Все callback-кнопки обрабатываются одним обработчиком с таблицей маршрутов
+    callback_router.register(dp)
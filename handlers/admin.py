@@ -0,0 +1,163 @@
+import logging
+from aiogram import types
+from aiogram.dispatcher.filters import Command
+from config import ADMIN_IDS
+from context import AppContext
+from database.recipe_catalog import recipe_catalog, recipe_id_sampler
+from database.identity_cache import user_identity_cache
+from database.entitlement_cache import entitlement_cache
+from database.user_profile import user_profiles
+from database.meal_texts import meal_texts
+from media_cache import telegram_file_cache, warm_up_photos
+from callback_router import callback_router
+from delayed_jobs import delayed_jobs
+from payment_gateway import payment_gateway
+from middlewares.deactivate_subcription import subscription_expiry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def is_admin(message: types.Message) -> bool:
+    return message.from_user.id in ADMIN_IDS
+
+
+def other_shards_note(context: AppContext, ttl: float) -> str:
+    """Команды перезагрузки обновляют только свой процесс, остальные шарды - по ttl."""
+    if context.shard_count <= 1:
+        return ""
+    return f"\nОстальные шарды перечитают данные в течение {ttl / 60:.0f} мин."
+
+
+async def reload_recipes_command(message: types.Message, context: AppContext):
+    """Перечитывает таблицу recipes после правки рецептов, без перезапуска бота."""
+    try:
+        count = await recipe_catalog.refresh(context.pool)
+        await recipe_id_sampler.load(context.pool)
+        logger.info(f"Администратор {message.from_user.id} обновил каталог рецептов.")
+        await message.answer(f"Каталог рецептов обновлен: {count} рецептов."
+                             + other_shards_note(context, recipe_catalog.ttl))
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении каталога рецептов: {e}")
+        await message.answer("Не удалось обновить каталог рецептов.")
+
+
+async def reload_texts_command(message: types.Message, context: AppContext):
+    """Перечитывает приветствия и прощания после правки таблицы meal_greetings."""
+    try:
+        count = await meal_texts.load(context.pool)
+        logger.info(f"Администратор {message.from_user.id} обновил приветствия.")
+        await message.answer(f"Приветствия и прощания обновлены: {count} текстов."
+                             + other_shards_note(context, meal_texts.ttl))
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении приветствий: {e}")
+        await message.answer("Не удалось обновить приветствия.")
+
+
+async def warm_images_command(message: types.Message, context: AppContext):
+    """Заранее загружает в Telegram картинки всех рецептов, чтобы утренняя рассылка шла по file_id."""
+    await recipe_catalog.ensure_loaded(context.pool)
+    image_urls = recipe_catalog.image_urls()
+    await message.answer(f"Начинаю загрузку картинок рецептов: {len(image_urls)} шт.")
+    uploaded = await warm_up_photos(message.bot, context.pool, message.chat.id, image_urls)
+    await message.answer(f"Готово. Загружено новых картинок: {uploaded}, всего в кеше: {len(telegram_file_cache)}.")
+
+
+async def stats_command(message: types.Message, context: AppContext):
+    """Показывает статистику кешей, чтобы видеть снятую с базы данных нагрузку."""
+    identity = user_identity_cache.stats()
+    lines = [
+        "Кеш идентификаторов пользователей:",
+        f"  записей: {identity['size']} из {identity['maxsize']}",
+        f"  попадания: {identity['hits']}",
+        f"  промахи: {identity['misses']}",
+        f"  доля попаданий: {identity['hit_rate']:.1%}",
+    ]
+    entitlements = entitlement_cache.stats()
+    lines += [
+        "Кеш проверки подписки:",
+        f"  записей: {entitlements['size']} из {entitlements['maxsize']}",
+        f"  попадания: {entitlements['hits']}, промахи: {entitlements['misses']}",
+    ]
+    profiles = user_profiles.stats()
+    lines += [
+        "Кеш профилей пользователей:",
+        f"  записей: {profiles['size']}",
+        f"  попадания: {profiles['hits']}, промахи: {profiles['misses']}",
+    ]
+    files = telegram_file_cache.stats()
+    lines += [
+        "Кеш file_id картинок:",
+        f"  записей: {files['size']}, отправок по file_id: {files['hits']}, загрузок по URL: {files['uploads']}",
+    ]
+    storage = context.dispatcher.storage
+    if hasattr(storage, "stats"):
+        fsm = storage.stats()
+        lines += [
+            "Хранилище состояний FSM:",
+            f"  записей в кеше: {fsm['size']}, ожидают записи: {fsm['dirty']}",
+            f"  попадания: {fsm['hits']}, промахи: {fsm['misses']}, сохранено: {fsm['flushed']}",
+        ]
+    worker_pool = getattr(context.dispatcher, "update_worker_pool", None)
+    if worker_pool is not None:
+        updates = worker_pool.stats()
+        lines += [
+            "Очередь входящих обновлений (webhook):",
+            f"  в очереди: {updates['depth']}, обработано: {updates['processed']}, "
+            f"отклонено: {updates['rejected']}, ошибок: {updates['errors']}",
+            f"  задержка: средняя {updates['avg_lag']:.3f} с, максимальная {updates['max_lag']:.3f} с",
+        ]
+    queue = getattr(message.bot, "outbound_queue", None)
+    if queue is not None:
+        queue_stats = queue.stats()
+        lines += [
+            "Очередь исходящих сообщений:",
+            f"  в очереди: {', '.join(f'{name} {depth}' for name, depth in queue_stats['depth'].items())}",
+        ]
+        for name, latency in queue_stats['latency'].items():
+            lines.append(f"  {name}: отправлено {latency['count']}, среднее {latency['avg']:.2f} с, "
+                         f"максимум {latency['max']:.2f} с")
+        lines.append(f"  повторов после RetryAfter: {queue_stats['retries']}, ошибок: {queue_stats['failures']}")
+    jobs = delayed_jobs.stats()
+    lines.append(f"Отложенные задачи: ожидают {jobs['pending']}, выполнено {jobs['executed']}, ошибок {jobs['failed']}")
+    if hasattr(context.pool, "peak_in_use"):
+        db_pool = context.pool.stats()
+        lines += [
+            "Пул соединений MySQL:",
+            f"  соединений: {db_pool['size']} (свободно {db_pool['free']}), границы {db_pool['minsize']}-{db_pool['maxsize']}",
+            f"  занято: {db_pool['in_use']}, пик: {db_pool['peak_in_use']}, таймаутов: {db_pool['timeouts']}",
+            f"  ожидание соединения: среднее {db_pool['wait']['avg'] * 1000:.1f} мс, "
+            f"максимум {db_pool['wait']['max'] * 1000:.1f} мс",
+            f"  прогрето: {db_pool['prewarmed']}, закрыто простаивающих: {db_pool['reaped']}",
+        ]
+    if hasattr(context.pool, "sessions"):
+        sessions = context.pool.sessions
+        lines.append(f"Сессии базы данных: обновлений {sessions}, запросов через общее соединение "
+                     f"{context.pool.shared_queries} (в среднем {context.pool.shared_queries / max(sessions, 1):.1f})")
+    payments = payment_gateway.stats()
+    lines.append("Платежный провайдер:")
+    for operation, latency in payments['latency'].items():
+        lines.append(f"  {operation}: запросов {latency['count']}, среднее {latency['avg']:.2f} с, максимум {latency['max']:.2f} с")
+    lines.append(f"  неудачных запросов после повторов: {payments['failures']}")
+    subscriptions = subscription_expiry.stats()
+    lines.append(f"Подписки: активных {subscriptions['active']}, ближайшее окончание {subscriptions['next_expiry']}, "
+                 f"деактивировано {subscriptions['deactivated']}")
+    routes = callback_router.stats(limit=5)
+    if routes:
+        lines.append("Самые затратные callback-маршруты:")
+        for route in routes:
+            lines.append(f"  {route['name']}: вызовов {route['calls']}, ошибок {route['errors']}, "
+                         f"среднее {route['avg_ms']:.1f} мс, максимум {route['max_ms']:.1f} мс")
+    await message.answer("\n".join(lines))
+
+
+def register_admin_handlers(context: AppContext):
+    dp = context.dispatcher
+    dp.register_message_handler(lambda msg: reload_recipes_command(msg, context),
+                                Command("reload_recipes"), is_admin, state="*")
+    dp.register_message_handler(lambda msg: reload_texts_command(msg, context),
+                                Command("reload_texts"), is_admin, state="*")
+    dp.register_message_handler(lambda msg: warm_images_command(msg, context),
+                                Command("warm_images"), is_admin, state="*")
+    dp.register_message_handler(lambda msg: stats_command(msg, context),
+                                Command("stats"), is_admin, state="*")
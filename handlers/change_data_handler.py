@@ -6,6 +6,7 @@ from aiogram.utils.exceptions import MessageCantBeEdited
 from states import UserData
 from menu.menu_messages import get_result_message, generate_data_confirmation_keyboard
 from context import AppContext
+from callback_router import callback_router
 
 logging.basicConfig(level=logging.INFO)
 
@@ -146,10 +147,10 @@ async def update_user_data(message: types.Message, state: FSMContext):
 
 def register_change_data_handlers(context: AppContext):
     dp = context.dispatcher
-    dp.register_callback_query_handler(parameter_change_handler, state=UserData.choosing_parameter_to_change)
+    callback_router.add(parameter_change_handler, state=UserData.choosing_parameter_to_change)
     dp.register_message_handler(change_height_handler, state=UserData.changing_height)
     dp.register_message_handler(change_weight_handler, state=UserData.changing_weight)
     dp.register_message_handler(change_age_handler, state=UserData.changing_age)
-    dp.register_callback_query_handler(change_gender_handler, state=UserData.changing_gender)
-    dp.register_callback_query_handler(change_activity_level_handler, state=UserData.changing_activity_level)
-    dp.register_callback_query_handler(change_meals_per_day_handler, state=UserData.changing_meals_per_day)
+    callback_router.add(change_gender_handler, state=UserData.changing_gender)
+    callback_router.add(change_activity_level_handler, state=UserData.changing_activity_level)
+    callback_router.add(change_meals_per_day_handler, state=UserData.changing_meals_per_day)
@@ -4,6 +4,7 @@ from aiogram.dispatcher import FSMContext
 import aiomysql
 from states import UserData
 from context import AppContext
+from callback_router import callback_router
 
 async def contact_callback_handler(callback_query: types.CallbackQuery, state: FSMContext, context: AppContext):
     tg_user_id = callback_query.from_user.id
@@ -34,8 +35,4 @@ async def contact_callback_handler(callback_query: types.CallbackQuery, state: F
     logging.info(f"State set to UserData:waiting_for_height for user {tg_user_id}")
 
 def register_contact_handler(context: AppContext):
-    dp = context.dispatcher
-    dp.register_callback_query_handler(
-        lambda cb, state: contact_callback_handler(cb, state, context=context),
-        lambda c: c.data == "share_contact"
-    )
+    callback_router.add(lambda cb, state: contact_callback_handler(cb, state, context=context), data="share_contact")
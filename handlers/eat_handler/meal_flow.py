@@ -0,0 +1,289 @@
+import random
+import logging
+from functools import partial
+from decimal import Decimal
+from aiogram import types, Dispatcher
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from database.database import (get_greeting, get_farewell,
+                               get_tg_user_id_by_user_id, get_user_id_by_tg_user_id,
+                               get_recipe_by_id, update_calories, subtract_calories,
+                               get_meal_status_for_today)
+from database.recipe_catalog import recipe_catalog
+from database.function import ask_if_ate
+from recipe import fetch_recipe
+from context import AppContext
+from callback_router import callback_router
+from media_cache import send_photo_cached, answer_photo_cached
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Кнопки времени приготовления: подпись и значение preparation_time
+PREP_TIME_OPTIONS = (
+    ("15-20 минут", "up_to_30_minutes"),
+    ("30-60 минут", "30_to_60_minutes"),
+    ("Более 60 минут", "more_than_60_minutes"),
+)
+# Выбранное время -> времена приготовления подходящих рецептов
+PREP_TIMES = {
+    "up_to_30_minutes": ["up_to_30_minutes"],
+    "30_to_60_minutes": ["up_to_30_minutes", "30_to_60_minutes"],
+    "more_than_60_minutes": ["up_to_30_minutes", "30_to_60_minutes", "more_than_60_minutes"],
+}
+# Сколько рецептов предлагаем на выбор
+RECIPE_CHOICES = 4
+RECIPES_PROMPT = "Выберите рецепт из предложенных:"
+
+
+def format_recipe(recipe) -> str:
+    message_text = f"*{recipe['title']}*\n\n"
+    if recipe.get("instructions"):
+        message_text += f"{recipe['instructions']}\n\n"
+    if recipe.get("ingredients"):
+        message_text += f"*Ингредиенты:*\n{recipe['ingredients']}\n\n"
+    lines = []
+    if recipe.get("calories") is not None:
+        lines.append(f"*Калории:* {recipe['calories']} ккал")
+    if recipe.get("protein") is not None:
+        lines.append(f"*Белки:* {recipe['protein']} г")
+    if recipe.get("fats") is not None:
+        lines.append(f"*Жиры:* {recipe['fats']} г")
+    if recipe.get("carbohydrates") is not None:
+        lines.append(f"*Углеводы:* {recipe['carbohydrates']} г")
+    return message_text + "\n".join(lines)
+
+
+async def get_recipe(pool, recipe_id):
+    """Рецепт из каталога в памяти; в базу идем, только если рецепта там нет."""
+    await recipe_catalog.ensure_loaded(pool)
+    recipe = recipe_catalog.get(recipe_id)
+    if recipe is None:
+        recipe = await get_recipe_by_id(pool, recipe_id)
+    return recipe
+
+
+class MealFlow:
+    """
+    Сценарий приема пищи: приветствие, выбор времени приготовления, выбор рецепта,
+    замена рецепта и "нет ингредиентов".
+
+    Завтрак, обед, ужин и перекус отличаются только параметрами: текстами,
+    картинкой приветствия, наличием выбора времени и тем, что делать после
+    отправки рецепта (after_send). Статические клавиатуры строятся один раз.
+    """
+
+    def __init__(self, meal_type: str, meal_name: str, greeting_image: str = None, uses_prep_time: bool = True,
+                 start_prompt: str = RECIPES_PROMPT, no_ingredients_prompt: str = RECIPES_PROMPT,
+                 after_send=None):
+        self.meal_type = meal_type
+        self.meal_name = meal_name
+        self.greeting_image = greeting_image
+        self.uses_prep_time = uses_prep_time
+        self.start_prompt = start_prompt
+        self.no_ingredients_prompt = no_ingredients_prompt
+        self.after_send = after_send
+        self.prep_time_question = f"Сколько у вас времени на приготовление {meal_name}?"
+
+        # callback_data кнопки времени -> времена приготовления рецептов
+        self.prep_time_map = {f"{meal_type}_{value}": prep_times for value, prep_times in PREP_TIMES.items()}
+        self.prep_time_keyboard = InlineKeyboardMarkup(row_width=3).add(*(
+            InlineKeyboardButton(text=text, callback_data=f"{meal_type}_{value}")
+            for text, value in PREP_TIME_OPTIONS
+        ))
+        self.reroll_data = f"{meal_type}_reroll" if uses_prep_time else f"{meal_type}_choose_recipe"
+        self.back_button = InlineKeyboardButton(text="Вернуться к выбору времени",
+                                                callback_data=f"{meal_type}_back_to_prep_time")
+
+    def routes(self) -> dict:
+        """Таблица callback_data (до первого ':') -> действие сценария."""
+        routes = {
+            f"{self.meal_type}_recipe": self.send_recipe,
+            f"{self.meal_type}_no_ingredients": self.no_ingredients,
+            self.reroll_data: self.reroll,
+        }
+        if self.uses_prep_time:
+            routes.update({data: self.choose_prep_time for data in self.prep_time_map})
+            routes[f"{self.meal_type}_back_to_prep_time"] = self.back_to_prep_time
+        return routes
+
+    def recipes_keyboard(self, recipes, prep_time_data=None) -> InlineKeyboardMarkup:
+        buttons = [
+            InlineKeyboardButton(text=recipe['title'], callback_data=f"{self.meal_type}_recipe:{recipe['id']}")
+            for recipe in random.sample(recipes, min(RECIPE_CHOICES, len(recipes)))
+        ]
+        if self.uses_prep_time:
+            buttons.append(InlineKeyboardButton(text="Еще рецепты", callback_data=f"{self.reroll_data}:{prep_time_data}"))
+            buttons.append(self.back_button)
+        else:
+            buttons.append(InlineKeyboardButton(text="Еще рецепты", callback_data=self.reroll_data))
+        return InlineKeyboardMarkup(row_width=1).add(*buttons)
+
+    async def fetch_recipes(self, pool, user_id, prep_time_data=None):
+        prep_times = self.prep_time_map.get(prep_time_data) if self.uses_prep_time else []
+        if prep_times is None:
+            logger.warning(f"Неверное значение времени приготовления: {prep_time_data}")
+            return None
+        return await fetch_recipe(self.meal_type, prep_times, user_id, pool)
+
+    async def start(self, dispatcher: Dispatcher, pool, user_id: int):
+        try:
+            tg_user_id = await get_tg_user_id_by_user_id(pool, user_id)
+            if not tg_user_id:
+                raise ValueError("tg_user_id is empty")
+
+            greeting_text = await get_greeting(pool, self.meal_type)
+            if not greeting_text:
+                logger.warning(f"Приветственное сообщение для {self.meal_name} не найдено")
+            elif self.greeting_image:
+                await send_photo_cached(dispatcher.bot, pool, tg_user_id, self.greeting_image, caption=greeting_text)
+            else:
+                await dispatcher.bot.send_message(tg_user_id, greeting_text)
+
+            if self.uses_prep_time:
+                await dispatcher.bot.send_message(tg_user_id, self.prep_time_question,
+                                                  reply_markup=self.prep_time_keyboard)
+            else:
+                recipes = await self.fetch_recipes(pool, user_id)
+                await dispatcher.bot.send_message(tg_user_id, self.start_prompt,
+                                                  reply_markup=self.recipes_keyboard(recipes))
+            logger.info(f"Сценарий {self.meal_type} запущен для пользователя с ID {user_id}.")
+        except Exception as e:
+            logger.error(f"Ошибка при запуске сценария {self.meal_type}: {e}")
+
+    async def choose_prep_time(self, callback_query: types.CallbackQuery, context: AppContext, user_id: int):
+        prep_time_data = callback_query.data
+        logger.info(f"Пользователь с ID {user_id} выбрал время приготовления: {prep_time_data}")
+        recipes = await self.fetch_recipes(context.pool, user_id, prep_time_data)
+        if recipes is None:
+            return
+        await callback_query.message.edit_text(RECIPES_PROMPT,
+                                               reply_markup=self.recipes_keyboard(recipes, prep_time_data))
+
+    async def reroll(self, callback_query: types.CallbackQuery, context: AppContext, user_id: int):
+        prep_time_data = callback_query.data.partition(":")[2] or None
+        recipes = await self.fetch_recipes(context.pool, user_id, prep_time_data)
+        if recipes is None:
+            return
+        keyboard = self.recipes_keyboard(recipes, prep_time_data)
+        # Telegram возвращает ошибку, если сообщение не изменилось
+        if callback_query.message.text != RECIPES_PROMPT or callback_query.message.reply_markup != keyboard:
+            await callback_query.message.edit_text(RECIPES_PROMPT, reply_markup=keyboard)
+        else:
+            logger.info("Сообщение и клавиатура не изменились, пропускаем edit_text.")
+
+    async def back_to_prep_time(self, callback_query: types.CallbackQuery, context: AppContext, user_id: int):
+        logger.info(f"Пользователь {callback_query.from_user.id} возвращается к выбору времени приготовления {self.meal_name}.")
+        await callback_query.message.edit_text(self.prep_time_question, reply_markup=self.prep_time_keyboard)
+
+    async def send_recipe(self, callback_query: types.CallbackQuery, context: AppContext, user_id: int):
+        pool = context.pool
+        recipe_id = callback_query.data.split(":")[1]
+        recipe = await get_recipe(pool, recipe_id)
+        if not recipe:
+            logger.warning(f"Рецепт с ID {recipe_id} не найден.")
+            return
+
+        no_ingredients_data = f"{self.meal_type}_no_ingredients:{recipe_id}"
+        if self.uses_prep_time:
+            no_ingredients_data += f":{self.meal_type}_{recipe['preparation_time']}"
+        keyboard = InlineKeyboardMarkup(row_width=1).add(
+            InlineKeyboardButton(text="У меня нет нужных ингредиентов", callback_data=no_ingredients_data)
+        )
+
+        message_text = format_recipe(recipe)
+        await callback_query.message.delete()
+        if recipe.get("image_url"):
+            await answer_photo_cached(callback_query.message, pool, recipe["image_url"], caption=message_text,
+                                      reply_markup=keyboard, parse_mode='Markdown')
+            farewell_text = await get_farewell(pool, self.meal_type)
+            if farewell_text:
+                await callback_query.message.answer(farewell_text)
+            else:
+                logger.warning(f"Прощальное сообщение для {self.meal_name} не найдено")
+        else:
+            await callback_query.message.answer(message_text, reply_markup=keyboard, parse_mode='Markdown')
+
+        if self.after_send:
+            await self.after_send(callback_query.from_user.id, user_id, recipe, context)
+
+    async def no_ingredients(self, callback_query: types.CallbackQuery, context: AppContext, user_id: int):
+        pool = context.pool
+        _, original_recipe_id, *prep_time_data = callback_query.data.split(":")
+        original_recipe = await get_recipe(pool, original_recipe_id)
+        if not original_recipe:
+            logger.warning(f"Оригинальный рецепт с ID {original_recipe_id} не найден.")
+            return
+
+        # Вычитаем калории рецепта, от которого пользователь отказался
+        recipe_calories = original_recipe.get('calories') or 0
+        if isinstance(recipe_calories, Decimal):
+            recipe_calories = float(recipe_calories)
+        await subtract_calories(pool, user_id, recipe_calories)
+
+        prep_time_data = prep_time_data[0] if prep_time_data else None
+        recipes = await self.fetch_recipes(pool, user_id, prep_time_data)
+        if recipes is None:
+            return
+        recipes = [recipe for recipe in recipes if str(recipe['id']) != original_recipe_id]
+        keyboard = self.recipes_keyboard(recipes, prep_time_data)
+
+        # Удаляем сообщение с рецептом и следующее за ним прощальное сообщение
+        try:
+            await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)
+            await callback_query.bot.delete_message(callback_query.message.chat.id,
+                                                    callback_query.message.message_id + 1)
+        except Exception as e:
+            logger.error(f"Ошибка при удалении сообщений: {e}")
+        await callback_query.message.answer(self.no_ingredients_prompt, reply_markup=keyboard)
+
+
+class MealFlowRouter:
+    """
+    Маршруты callback-кнопок сценариев приема пищи.
+
+    Сценарии добавляют сюда свои действия при импорте, а при регистрации они
+    попадают в общий callback_router. Внутренний id пользователя определяется
+    один раз на нажатие и передается действию.
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def add_flow(self, flow: MealFlow):
+        self._routes.update(flow.routes())
+
+    def add(self, callback_data: str, action):
+        self._routes[callback_data] = action
+
+    async def handle(self, callback_query: types.CallbackQuery, action, context: AppContext):
+        try:
+            user_id = await get_user_id_by_tg_user_id(context.pool, callback_query.from_user.id)
+            await action(callback_query, context, user_id)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке {callback_query.data}: {e}")
+
+    def register(self, context: AppContext):
+        for callback_data, action in self._routes.items():
+            callback_router.add(partial(self.handle, action=action, context=context), data=callback_data)
+
+
+meal_flow_router = MealFlowRouter()
+
+
+def register_meal_flow_handlers(context: AppContext):
+    meal_flow_router.register(context)
+
+
+async def ask_if_ate_for(meal_type: str, tg_user_id, user_id, recipe, context: AppContext):
+    """Спрашивает, поел ли пользователь, если этот прием пищи еще не отмечен сегодня."""
+    meal_status = await get_meal_status_for_today(context.pool, user_id)
+    if meal_status[meal_type] == 0:
+        await ask_if_ate(tg_user_id, meal_type, context, recipe["calories"])
+        return True
+    return False
+
+
+async def add_recipe_calories(user_id, recipe, context: AppContext):
+    await update_calories(context.pool, user_id, recipe["calories"])
+    logger.info(f"Обновлено количество калорий для пользователя с ID {user_id}: {recipe['calories']} ккал")
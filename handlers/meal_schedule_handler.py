@@ -6,11 +6,13 @@ from states import UserData
 import aiomysql
 from scheduler import add_daily_task
 from database.database import get_meals_per_day, get_user_id_by_tg_user_id, get_tg_user_id_by_user_id
+from database.user_profile import user_profiles
 from datetime import timedelta
 import pytz
 from context import AppContext
 from functools import partial
 from datetime import datetime
+from callback_router import callback_router
 
 logging.basicConfig(level=logging.INFO)
 
@@ -295,6 +297,8 @@ async def save_meal_times(message: types.Message, state: FSMContext, context: Ap
                                          (user_id_db, breakfast_time_utc, lunch_time_utc, dinner_time_utc, timezone))
 
                 await conn.commit()
+                # Расписание и часовой пояс могли измениться - профиль пользователя загрузится заново
+                user_profiles.invalidate(user_id_db)
                 logging.info(f"Meal times for user {user_id} saved successfully.")
                 await message.edit_text(
                     "Теперь вам доступна кнопка «Меню», она находится слева снизу и выделяется синим цветом ‼️\n\n"
@@ -385,18 +389,16 @@ def validate_time_format(time_str):
 def register_meal_schedule_handlers(context: AppContext):
     dp = context.dispatcher
     dp.register_message_handler(choose_timezone, commands="set_meal_times", state="*")
-    dp.register_callback_query_handler(set_timezone, lambda c: c.data.startswith("tz_"), state=UserData.waiting_for_timezone)
+    callback_router.add(set_timezone, prefix="tz_", state=UserData.waiting_for_timezone)
     dp.register_message_handler(partial(set_breakfast_time, context=context), state=UserData.waiting_for_breakfast_time)
     dp.register_message_handler(set_lunch_time, state=UserData.waiting_for_lunch_time)
     dp.register_message_handler(set_dinner_time, state=UserData.waiting_for_dinner_time)
-    dp.register_callback_query_handler(change_option_callback, state=UserData.editing_options)
+    callback_router.add(change_option_callback, state=UserData.editing_options)
     dp.register_message_handler(change_breakfast_time, state=UserData.changing_breakfast_time)
     dp.register_message_handler(change_lunch_time, state=UserData.changing_lunch_time)
     dp.register_message_handler(change_dinner_time, state=UserData.changing_dinner_time)
-    dp.register_callback_query_handler(change_timezone, lambda c: c.data.startswith("tz_"), state=UserData.changing_timezone)
-    dp.register_callback_query_handler(
-        partial(confirm_data, context=context),
-        lambda c: c.data in ["confirm", "edit"],
-        state=UserData.confirming_meal_times
-    )
+    callback_router.add(change_timezone, prefix="tz_", state=UserData.changing_timezone)
+    for callback_data in ("confirm", "edit"):
+        callback_router.add(partial(confirm_data, context=context), data=callback_data,
+                            state=UserData.confirming_meal_times)
 
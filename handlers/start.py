@@ -8,6 +8,8 @@ import logging
 from context import AppContext
 from datetime import datetime, timedelta
 from scheduler import scheduler
+from media_cache import answer_photo_cached
+from callback_router import callback_router
 
 
 #scheduler = SchedulerSingleton().scheduler
@@ -16,8 +18,8 @@ async def send_welcome(message: types.Message, context: AppContext = None):
     keyboard = InlineKeyboardMarkup()
     intro_button = InlineKeyboardButton("Познакомиться", callback_data="introduce")
     keyboard.add(intro_button)
-    await message.answer_photo(
-        photo="https://i.imgur.com/C31Zmpq.jpeg",
+    await answer_photo_cached(
+        message, context.pool, "https://i.imgur.com/C31Zmpq.jpeg",
         caption=(
             "Поздравляю, Вы на пути к здоровому телу мечты🔥\n\n"
             "Давайте знакомиться, я - бот Ирины Олейник. Я буду вашим карманным диетологом и помогу вам достичь желаемого веса.\n\n"
@@ -102,8 +104,8 @@ async def handle_intro(callback_query: types.CallbackQuery, state: FSMContext, c
                 logging.error(f"Ошибка в базе данных: {err}")
 
     await callback_query.message.edit_reply_markup()
-    await callback_query.message.answer_photo(
-        photo="https://i.imgur.com/bhM3Kss.png",
+    await answer_photo_cached(
+        callback_query.message, context.pool, "https://i.imgur.com/bhM3Kss.png",
         caption=(
             f"Приятно познакомиться, {username}! Осталось немного, чтобы завершить регистрацию.\n\n"
             "А теперь давайте определимся, какую норму калорий в сутки вам необходимо получать.\n\n"
@@ -119,4 +121,4 @@ async def handle_intro(callback_query: types.CallbackQuery, state: FSMContext, c
 def register_start_handler(context: AppContext):
     dp = context.dispatcher
     dp.register_message_handler(lambda msg, state=None: on_start(msg, state, context), Command("start"))
-    dp.register_callback_query_handler(lambda cb, state=None: handle_intro(cb, state, context), lambda c: c.data == "introduce")
+    callback_router.add(lambda cb, state=None: handle_intro(cb, state, context), data="introduce")
@@ -5,6 +5,8 @@ from aiogram.dispatcher import FSMContext
 from states import UserData
 from menu.menu_messages import generate_data_confirmation_keyboard, get_result_message
 from context import AppContext
+from media_cache import answer_photo_cached
+from callback_router import callback_router
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -97,8 +99,8 @@ async def activity_level_handler(callback_query: types.CallbackQuery, state: FSM
     await callback_query.message.delete()
 
     # Отправляем новое сообщение с фото и текстом
-    await callback_query.message.answer_photo(
-        photo="https://i.imgur.com/OsMNHlm.png",
+    await answer_photo_cached(
+        callback_query.message, context.pool, "https://i.imgur.com/OsMNHlm.png",
         caption="Теперь расскажите мне, сколько приемов пищи в день будет?🥗",
         reply_markup=keyboard
     )
@@ -130,6 +132,6 @@ def register_user_data_handlers(context: AppContext):
     dp.register_message_handler(lambda msg, state=None: height_handler(msg, state, context), state=UserData.waiting_for_height)
     dp.register_message_handler(lambda msg, state=None: weight_handler(msg, state, context), state=UserData.waiting_for_weight)
     dp.register_message_handler(lambda msg, state=None: age_handler(msg, state, context), state=UserData.waiting_for_age)
-    dp.register_callback_query_handler(lambda cb, state=None: gender_handler(cb, state, context), state=UserData.waiting_for_gender)
-    dp.register_callback_query_handler(lambda cb, state=None: activity_level_handler(cb, state, context), state=UserData.waiting_for_activity_level)
-    dp.register_callback_query_handler(lambda cb, state=None: meals_per_day_handler(cb, state, context), state=UserData.waiting_for_meals_per_day)
+    callback_router.add(lambda cb, state=None: gender_handler(cb, state, context), state=UserData.waiting_for_gender)
+    callback_router.add(lambda cb, state=None: activity_level_handler(cb, state, context), state=UserData.waiting_for_activity_level)
+    callback_router.add(lambda cb, state=None: meals_per_day_handler(cb, state, context), state=UserData.waiting_for_meals_per_day)
@@ -1,33 +1,93 @@
 import asyncio
-from aiogram import Bot, Dispatcher
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
-from config import BOT_TOKEN
+from aiogram import Dispatcher
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
+from config import (BOT_TOKEN, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, OUTBOUND_WORKERS,
+                    FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL, BOT_MODE, TELEGRAM_API_URL, WEBHOOK_URL,
+                    WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT, UPDATE_WORKERS, UPDATE_QUEUE_SIZE,
+                    SHARD_ID, SHARD_COUNT)
 from handlers import register_handlers
-from scheduler import start_scheduler, load_tasks_from_db, schedule_task_reload, log_all_jobs
+from scheduler import (start_scheduler, load_tasks_from_db, schedule_task_sync, log_all_jobs,
+                       schedule_notification_dispatch, schedule_pool_maintenance)
 from context import AppContext
 from database.database import create_pool
+from database.fsm_storage import MySQLStorage
+from database.recipe_catalog import recipe_catalog
+from database.identity_cache import user_identity_cache
+from media_cache import telegram_file_cache
+from outbound_queue import OutboundQueue, QueuedBot
+from webhook import run_webhook
+from delayed_jobs import delayed_jobs
+from payment_gateway import payment_gateway
+from database.meal_texts import meal_texts
+from database.session import SessionPool, DBSessionMiddleware
+from database.pool_manager import ManagedPool
+from daily_rollover import run_rollover, schedule_daily_rollover
 import logging
-from middlewares.deactivate_subcription import schedule_subscription_check
+from middlewares.deactivate_subcription import start_subscription_expiry, subscription_expiry
+from database.migrations import apply_migrations
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 async def on_startup(context: AppContext):
+    try:
+        await apply_migrations(context.pool)
+    except Exception as e:
+        # Бот работает и на старой схеме, только без новых индексов
+        logger.error(f"Не удалось применить миграции схемы базы данных: {e}")
+    try:
+        await recipe_catalog.load(context.pool)
+    except Exception as e:
+        # Каталог подгрузится при первом запросе рецептов
+        logger.error(f"Не удалось загрузить каталог рецептов: {e}")
+    try:
+        await user_identity_cache.warm(context.pool)
+    except Exception as e:
+        # Кеш заполнится сам по мере обращений к пользователям
+        logger.error(f"Не удалось прогреть кеш идентификаторов пользователей: {e}")
+    try:
+        await telegram_file_cache.load(context.pool)
+    except Exception as e:
+        # Без сохраненных file_id картинки просто отправятся по URL
+        logger.error(f"Не удалось загрузить кеш file_id картинок: {e}")
+    try:
+        await meal_texts.load(context.pool)
+    except Exception as e:
+        # Тексты загрузятся при первой рассылке
+        logger.error(f"Не удалось загрузить приветствия: {e}")
     await start_scheduler()
-    await schedule_subscription_check(context)
+    # Каждый шард следит за окончанием подписок своих пользователей
+    await start_subscription_expiry(context)
     await load_tasks_from_db(context)
-    await schedule_task_reload(context)
+    try:
+        await delayed_jobs.load(context)
+    except Exception as e:
+        # Новые задачи все равно будут выполняться, пропадут только сохраненные до перезапуска
+        logger.error(f"Не удалось загрузить отложенные задачи: {e}")
+    delayed_jobs.start(context)
+    await schedule_task_sync(context)
+    await schedule_notification_dispatch(context)
+    # Догоняем смену суток, пропущенную, пока бот был остановлен
+    await run_rollover(context)
+    await schedule_daily_rollover(context)
+    await schedule_pool_maintenance(context)
     await log_all_jobs()
 
 
 async def main():
-    pool = await create_pool()
-    bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
+    # Внутри обработки обновления все запросы к базе идут через одно соединение
+    pool = SessionPool(ManagedPool(await create_pool()))
+    # Все отправки сообщений идут через общую очередь с учетом лимитов Telegram
+    outbound_queue = OutboundQueue(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, OUTBOUND_WORKERS)
+    server = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else TELEGRAM_PRODUCTION
+    bot = QueuedBot(token=BOT_TOKEN, server=server, outbound_queue=outbound_queue)
+    # Состояния FSM хранятся в базе и переживают перезапуск бота
+    storage = MySQLStorage(pool, cache_size=FSM_CACHE_SIZE, flush_interval=FSM_FLUSH_INTERVAL)
     dp = Dispatcher(bot, storage=storage)
+    dp.middleware.setup(DBSessionMiddleware(pool))
 
     # Создаем контекст и передаем пул соединений
-    context = AppContext(dispatcher=dp, pool=pool)
+    context = AppContext(dispatcher=dp, pool=pool, shard_id=SHARD_ID, shard_count=SHARD_COUNT)
 
     try:
         # Запускаем задачи при старте
@@ -37,10 +97,28 @@ async def main():
         register_handlers(context)
 
         # Запускаем бота
-        await dp.start_polling()
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, WEBHOOK_URL, WEBHOOK_PATH, WEBAPP_HOST, WEBAPP_PORT,
+                              UPDATE_WORKERS, UPDATE_QUEUE_SIZE, secret_token=WEBHOOK_SECRET)
+        else:
+            await dp.start_polling()
     except Exception as e:
         logger.error(f"Произошла ошибка при запуске бота: {e}")
     finally:
+        # Сохраняем несохраненные состояния FSM
+        try:
+            await storage.close()
+        except Exception as e:
+            logger.error(f"Не удалось сохранить состояния FSM: {e}")
+
+        # Останавливаем отложенные задачи (несработавшие останутся в базе)
+        await delayed_jobs.close()
+        await subscription_expiry.close()
+        payment_gateway.close()
+
+        # Останавливаем очередь исходящих сообщений
+        await outbound_queue.close()
+
         # Закрываем сессию бота
         await bot.session.close()
 
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from aiogram import Bot, types
+from aiogram.utils.exceptions import WrongFileIdentifier, WrongRemoteFileIdSpecified
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Пауза между загрузками при прогреве, чтобы не упираться в лимиты Telegram на один чат
+WARMUP_DELAY_SECONDS = 1.0
+
+
+class TelegramFileCache:
+    """
+    Постоянный кеш URL картинки -> file_id Telegram.
+
+    Первая отправка идет по URL (Telegram скачивает и обрабатывает картинку),
+    полученный file_id сохраняется в таблицу telegram_file_ids, и дальше
+    та же картинка отправляется по file_id без повторной загрузки.
+    """
+
+    def __init__(self):
+        self._file_ids = {}
+        self.hits = 0
+        self.uploads = 0
+
+    def __len__(self):
+        return len(self._file_ids)
+
+    def get(self, url):
+        return self._file_ids.get(url)
+
+    async def load(self, pool) -> int:
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT url, file_id FROM telegram_file_ids")
+                rows = await cursor.fetchall()
+        self._file_ids = dict(rows)
+        logger.info(f"Загружено file_id картинок: {len(rows)}.")
+        return len(rows)
+
+    async def store(self, pool, url, file_id):
+        self._file_ids[url] = file_id
+        try:
+            async with pool.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                        INSERT INTO telegram_file_ids (url, file_id)
+                        VALUES (%s, %s)
+                        ON DUPLICATE KEY UPDATE file_id = VALUES(file_id)
+                        """, (url, file_id)
+                    )
+                    await connection.commit()
+        except Exception as e:
+            # file_id остается в памяти процесса, в базу сохраним при следующей загрузке
+            logger.error(f"Не удалось сохранить file_id для {url}: {e}")
+
+    async def forget(self, pool, url):
+        self._file_ids.pop(url, None)
+        try:
+            async with pool.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("DELETE FROM telegram_file_ids WHERE url = %s", (url,))
+                    await connection.commit()
+        except Exception as e:
+            logger.error(f"Не удалось удалить file_id для {url}: {e}")
+
+    def stats(self) -> dict:
+        return {"size": len(self), "hits": self.hits, "uploads": self.uploads}
+
+
+telegram_file_cache = TelegramFileCache()
+
+
+async def send_photo_cached(bot: Bot, pool, chat_id, photo_url: str, **kwargs) -> types.Message:
+    """send_photo, который по возможности отправляет картинку по сохраненному file_id."""
+    file_id = telegram_file_cache.get(photo_url)
+    if file_id:
+        try:
+            message = await bot.send_photo(chat_id, photo=file_id, **kwargs)
+            telegram_file_cache.hits += 1
+            return message
+        except (WrongFileIdentifier, WrongRemoteFileIdSpecified) as e:
+            logger.warning(f"Сохраненный file_id для {photo_url} больше не действует: {e}")
+            await telegram_file_cache.forget(pool, photo_url)
+
+    message = await bot.send_photo(chat_id, photo=photo_url, **kwargs)
+    telegram_file_cache.uploads += 1
+    if message.photo:
+        # Самый большой размер идет последним
+        await telegram_file_cache.store(pool, photo_url, message.photo[-1].file_id)
+    return message
+
+
+async def answer_photo_cached(message: types.Message, pool, photo_url: str, **kwargs) -> types.Message:
+    """Аналог message.answer_photo с кешем file_id."""
+    return await send_photo_cached(message.bot, pool, message.chat.id, photo_url, **kwargs)
+
+
+async def warm_up_photos(bot: Bot, pool, chat_id, photo_urls) -> int:
+    """
+    Загружает в Telegram картинки, для которых еще нет file_id.
+
+    Картинки отправляются в служебный чат и сразу удаляются - нужен только file_id.
+    """
+    uploaded = 0
+    for photo_url in dict.fromkeys(photo_urls):
+        if not photo_url or telegram_file_cache.get(photo_url):
+            continue
+        try:
+            message = await send_photo_cached(bot, pool, chat_id, photo_url, disable_notification=True)
+            await bot.delete_message(chat_id, message.message_id)
+            uploaded += 1
+        except Exception as e:
+            logger.error(f"Не удалось загрузить картинку {photo_url}: {e}")
+        await asyncio.sleep(WARMUP_DELAY_SECONDS)
+    logger.info(f"Прогрев картинок завершен: загружено {uploaded}.")
+    return uploaded
@@ -10,7 +10,10 @@ from payments import create_payment_link
 from aiomysql import DictCursor
 from database.database import get_user_id_by_tg_user_id, check_existing_meal_times
 from handlers.meal_schedule_handler import choose_timezone
+from database.entitlement_cache import entitlement_cache
+from database.user_profile import user_profiles
 import asyncio
+from callback_router import callback_router
 
 
 activity_level_display = {
@@ -117,6 +120,8 @@ async def confirm_data_handler(callback_query: types.CallbackQuery, state: FSMCo
                         )
                     )
                     await connection.commit()
+                    # Пользователь стал зарегистрированным - проверка подписки должна это увидеть
+                    entitlement_cache.invalidate(tg_user_id=user_id)
                     logging.info(f"User {user_id} data confirmed and updated.")
 
                 except MySQLError as e:
@@ -126,6 +131,11 @@ async def confirm_data_handler(callback_query: types.CallbackQuery, state: FSMCo
                         "Произошла ошибка при обновлении данных. Пожалуйста, попробуйте позже.")
                     return
 
+        # Норма калорий изменилась - профиль пользователя загрузится заново при следующем подборе рецептов
+        user_db_id = await get_user_id_by_tg_user_id(context.pool, user_id)
+        if user_db_id is not None:
+            user_profiles.invalidate(user_db_id)
+
         # Отправка результата
         result_message = (
             f"Ваша суточная норма калорий составляет {calorie_norm:.2f} ккал.\n"
@@ -299,19 +309,15 @@ async def handle_back_to_subscription(callback_query: types.CallbackQuery, state
 
 
 def register_menu_messages_handlers(context: AppContext):
-    dp = context.dispatcher
-    dp.register_callback_query_handler(
+    callback_router.add(
         lambda cbq, state: confirm_data_handler(cbq, state, context),
         state=UserData.confirming_data,
-        text="confirm_data"
+        data="confirm_data"
     )
-    dp.register_callback_query_handler(change_data_handler, state=UserData.confirming_data, text="change_data")
-    dp.register_callback_query_handler(lambda cbq, state: subscription_callback_handler(cbq, state, context),
-                                           state=UserData.managing_subscription, text_startswith="free_trial")
-    dp.register_callback_query_handler(lambda cbq, state: subscription_callback_handler(cbq, state, context),
-                                           state=UserData.managing_subscription, text_startswith="subscription_3_days")
-    dp.register_callback_query_handler(lambda cbq, state: subscription_callback_handler(cbq, state, context),
-                                       state=UserData.managing_subscription, text_startswith="subscription_30_days")
-    dp.register_callback_query_handler(handle_back_to_subscription, lambda c: c.data == "back_to_subscription", state= UserData.managing_subscription)
+    callback_router.add(change_data_handler, state=UserData.confirming_data, data="change_data")
+    for prefix in ("free_trial", "subscription_3_days", "subscription_30_days"):
+        callback_router.add(lambda cbq, state: subscription_callback_handler(cbq, state, context),
+                            state=UserData.managing_subscription, prefix=prefix)
+    callback_router.add(handle_back_to_subscription, data="back_to_subscription", state=UserData.managing_subscription)
 
 
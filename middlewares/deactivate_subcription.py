@@ -1,35 +1,141 @@
+import asyncio
+import heapq
 import logging
+from datetime import datetime
 from context import AppContext
 from aiomysql import DictCursor
-from scheduler import scheduler
+from scheduler import notification_dispatcher
+from sharding import shard_condition
+from database.entitlement_cache import entitlement_cache
+from database.user_profile import user_profiles
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-# Получение экземпляра планировщик
 
-async def deactivate_expired_subscriptions_task(context: AppContext):
-    async with context.pool.acquire() as connection:
-        async with connection.cursor(DictCursor) as cursor:
+# Запас, чтобы NOW() в базе точно оказался позже end_date, когда срабатывает таймер
+EXPIRY_GRACE_SECONDS = 1
+
+
+class SubscriptionExpiry:
+    """
+    Куча окончаний активных подписок вместо периодического UPDATE по всей таблице.
+
+    Куча загружается из subscriptions один раз при старте, а activate_subscription
+    и apply_free_trial добавляют в нее новые сроки. Одна фоновая задача спит до
+    ближайшего окончания и одним запросом выключает подписки и задачи ровно тех
+    пользователей, чей срок вышел. Продленные подписки отсеиваются по словарю
+    актуальных сроков (устаревшие записи кучи просто пропускаются).
+    """
+
+    def __init__(self):
+        self._heap = []
+        # user_id -> актуальное время окончания (timestamp)
+        self._end = {}
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self.deactivated = 0
+
+    def __len__(self):
+        return len(self._end)
+
+    def track(self, user_id: int, end_date: datetime):
+        expires_at = end_date.timestamp()
+        self._end[user_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, user_id))
+        self._wakeup.set()
+
+    async def load(self, context: AppContext) -> int:
+        condition, params = shard_condition(context)
+        async with context.pool.acquire() as connection:
+            async with connection.cursor(DictCursor) as cursor:
+                await cursor.execute(
+                    f"SELECT user_id, end_date FROM subscriptions WHERE is_active = TRUE AND {condition}", params
+                )
+                rows = await cursor.fetchall()
+
+        for row in rows:
+            if row['end_date'] is not None:
+                self.track(row['user_id'], row['end_date'])
+        logging.info(f"Загружено активных подписок: {len(rows)}.")
+        return len(rows)
+
+    def start(self, context: AppContext):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run(context))
+
+    def _pop_due(self, now: float):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(self._heap)
+            # Подписку могли продлить - тогда в куче уже лежит новый срок
+            if self._end.get(user_id) == expires_at:
+                del self._end[user_id]
+                due.append(user_id)
+        return due
+
+    async def _run(self, context: AppContext):
+        while True:
+            self._wakeup.clear()
+            now = datetime.now().timestamp()
+            due = self._pop_due(now - EXPIRY_GRACE_SECONDS)
+            if due:
+                try:
+                    await self.deactivate(context, due)
+                except Exception as e:
+                    logging.error(f"Ошибка при деактивации подписок: {e}")
+                    # Повторим через минуту, если подписку за это время не продлили
+                    retry_at = datetime.fromtimestamp(now + 60)
+                    for user_id in due:
+                        if user_id not in self._end:
+                            self.track(user_id, retry_at)
+                continue
+
+            delay = self._heap[0][0] + EXPIRY_GRACE_SECONDS - now if self._heap else None
             try:
-                logging.info("Проверка просроченных подписок.")
-                result = await cursor.execute("""
-                    UPDATE subscriptions
-                    SET is_active = FALSE
-                    WHERE end_date < NOW() AND is_active = TRUE;
-                """)
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def deactivate(self, context: AppContext, user_ids: list) -> int:
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        async with context.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                # Подписки и задачи уведомлений выключаются одним запросом; end_date проверяем
+                # еще раз на случай продления в другом процессе
+                result = await cursor.execute(f"""
+                    UPDATE subscriptions s
+                    LEFT JOIN scheduled_tasks t ON t.user_id = s.user_id
+                    SET s.is_active = FALSE, t.is_active = FALSE
+                    WHERE s.user_id IN ({placeholders}) AND s.is_active = TRUE AND s.end_date <= NOW()
+                """, user_ids)
                 await connection.commit()
-                logging.info(f"Деактивировано подписок: {result}")
-            except Exception as e:
-                logging.error(f"Ошибка при деактивации подписок: {e}")
-
-async def schedule_subscription_check(context: AppContext, interval_minutes: int = 59):
-    scheduler.add_job(
-        deactivate_expired_subscriptions_task,
-        trigger='interval',
-        minutes=interval_minutes,
-        args=[context],
-        id='deactivate_expired_subscriptions',
-        replace_existing=True
-    )
-    logging.info(f"Задача деактивации подписок запланирована на каждые {interval_minutes} минут.")
 
+        entitlement_cache.invalidate_users(user_ids)
+        user_profiles.invalidate_users(user_ids)
+        for user_id in user_ids:
+            notification_dispatcher.remove_user(user_id)
+        self.deactivated += len(user_ids)
+        logging.info(f"Деактивировано подписок: {len(user_ids)} (изменено строк: {result}).")
+        return result
+
+    async def close(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+    def stats(self) -> dict:
+        next_expiry = datetime.fromtimestamp(self._heap[0][0]) if self._heap else None
+        return {"active": len(self), "next_expiry": next_expiry, "deactivated": self.deactivated}
+
+
+subscription_expiry = SubscriptionExpiry()
+
+
+async def start_subscription_expiry(context: AppContext):
+    try:
+        await subscription_expiry.load(context)
+    except Exception as e:
+        logging.error(f"Не удалось загрузить сроки подписок: {e}")
+    subscription_expiry.start(context)
+    logging.info("Деактивация подписок запущена по ближайшему сроку окончания.")
@@ -2,6 +2,9 @@ import logging
 from datetime import datetime, timedelta
 from aiomysql import DictCursor
 from database.database import get_user_id_by_tg_user_id
+from database.entitlement_cache import entitlement_cache
+from database.user_profile import user_profiles
+from middlewares.deactivate_subcription import subscription_expiry
 import asyncio
 
 
@@ -33,6 +36,9 @@ async def activate_subscription(pool, user_tg_id: int, days: int):
 
                 # Коммит изменений
                 await connection.commit()
+                entitlement_cache.invalidate(user_id=user_id)
+                user_profiles.invalidate(user_id)
+                subscription_expiry.track(user_id, end_date)
 
                 # Логируем успешную активацию подписки
                 logging.info(f"Subscription activated for user {user_id} until {end_date}.")
@@ -111,18 +117,19 @@ async def apply_free_trial(pool, user_id: int):
         return False
 
     try:
+        end_date = datetime.now() + timedelta(days=1)
         async with pool.acquire() as connection:
             async with connection.cursor(DictCursor) as cursor:
                 # Вставляем или обновляем запись в таблице subscriptions
                 await cursor.execute("""
                     INSERT INTO subscriptions (user_id, start_date, end_date, is_active)
-                    VALUES (%s, NOW(), DATE_ADD(NOW(), INTERVAL 1 DAY), TRUE)
+                    VALUES (%s, NOW(), %s, TRUE)
                     AS new_data
                     ON DUPLICATE KEY UPDATE 
                         start_date = new_data.start_date, 
                         end_date = new_data.end_date, 
                         is_active = new_data.is_active
-                """, (user['id'],))
+                """, (user['id'], end_date))
 
                 # Обновляем флаг free_trial_used в таблице users
                 await cursor.execute("""
@@ -133,6 +140,9 @@ async def apply_free_trial(pool, user_id: int):
 
                 # Подтверждаем изменения в транзакции
                 await connection.commit()
+                entitlement_cache.invalidate(tg_user_id=user_id)
+                user_profiles.invalidate(user['id'])
+                subscription_expiry.track(user['id'], end_date)
 
                 logging.info(f"Free trial day activated for user {user_id}.")
                 return True
@@ -6,6 +6,7 @@ from aiogram.dispatcher.storage import FSMContext
 import logging
 from states import UserData
 from menu.menu_messages import generate_subscription_keyboard
+from database.entitlement_cache import entitlement_cache
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -34,36 +35,18 @@ class SubscriptionMiddleware(BaseMiddleware):
             return
 
         try:
-            # Используем пул соединений
-            async with self.pool.acquire() as connection:
-                async with connection.cursor(aiomysql.DictCursor) as cursor:
-
-                    # Выполняем первый запрос и обрабатываем результат
-                    await cursor.execute("SELECT * FROM users WHERE tg_user_id = %s", (user_id,))
-                    user = await cursor.fetchone()
-                    if not user or not user.get('is_registered'):
-                        return  # Пользователь не зарегистрирован, позволяем продолжить
-
-                    # Выполняем второй запрос и обрабатываем результат
-                    await cursor.execute("SELECT * FROM subscriptions WHERE user_id = %s", (user['id'],))
-                    subscription_user = await cursor.fetchone()
-                    if not subscription_user:
-                        return  # Пользователь не найден в таблице subscriptions, позволяем продолжить
-
-                    # Выполняем третий запрос и обрабатываем результат
-                    await cursor.execute("""
-                        SELECT * FROM subscriptions 
-                        WHERE user_id = %s AND is_active = TRUE AND end_date > NOW()
-                    """, (user['id'],))
-                    subscription = await cursor.fetchone()
-                    if not subscription:
-                        await entity.answer("У вас нет активной подписки. Пожалуйста, оформите подписку.",
-                                            reply_markup=generate_subscription_keyboard())
-
-                        await state.set_state(UserData.managing_subscription.state)
-                        new_state = await state.get_state()
-                        logger.info(f"Новое состояние пользователя {user_id}: {new_state}")
-                        raise CancelHandler()
-
+            # Решение о доступе берем из кеша: запрос к базе нужен только после
+            # окончания подписки или сброса записи
+            entitlement = await entitlement_cache.get(self.pool, user_id)
         except aiomysql.Error as err:
             logger.error(f"Ошибка базы данных: {err}")
+            return
+
+        if not entitlement.allowed:
+            await entity.answer("У вас нет активной подписки. Пожалуйста, оформите подписку.",
+                                reply_markup=generate_subscription_keyboard())
+
+            await state.set_state(UserData.managing_subscription.state)
+            new_state = await state.get_state()
+            logger.info(f"Новое состояние пользователя {user_id}: {new_state}")
+            raise CancelHandler()
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+import pytz
+from outbound_queue import BROADCAST, send_priority
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько пропущенных минут догоняем, если рассылка запустилась с опозданием
+MAX_CATCHUP_MINUTES = 5
+
+
+def minute_of_day(task_time) -> int:
+    return task_time.hour * 60 + task_time.minute
+
+
+class NotificationDispatcher:
+    """
+    Рассылка уведомлений о приемах пищи по минутным корзинам.
+
+    Вместо отдельной cron-задачи APScheduler на каждого пользователя и прием пищи
+    храним индекс "минута суток (UTC) -> пользователи". Одна задача раз в минуту
+    берет нужную корзину и вызывает start_breakfast/start_lunch/start_dinner
+    с ограниченной параллельностью. Добавление, изменение и удаление стоят O(1).
+    """
+
+    def __init__(self, handlers: dict, concurrency: int):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        # минута суток -> {(user_id, task_type): None}; dict сохраняет порядок и удаляет за O(1)
+        self._buckets = {}
+        # (user_id, task_type) -> минута суток
+        self._entries = {}
+        self._last_minute = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def add(self, user_id: int, task_type: str, task_time):
+        """Добавляет уведомление или переносит его на новое время."""
+        key = (user_id, task_type)
+        minute = minute_of_day(task_time)
+        previous = self._entries.get(key)
+        if previous == minute:
+            return
+        if previous is not None:
+            self._discard(previous, key)
+        self._entries[key] = minute
+        self._buckets.setdefault(minute, {})[key] = None
+
+    def remove(self, user_id: int, task_type: str) -> bool:
+        key = (user_id, task_type)
+        minute = self._entries.pop(key, None)
+        if minute is None:
+            return False
+        self._discard(minute, key)
+        return True
+
+    def remove_user(self, user_id: int) -> int:
+        """Удаляет все уведомления пользователя (например, после окончания подписки)."""
+        return sum(self.remove(user_id, task_type) for task_type in self.handlers)
+
+    def _discard(self, minute, key):
+        bucket = self._buckets.get(minute)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._buckets[minute]
+
+    def get_minute(self, user_id: int, task_type: str):
+        return self._entries.get((user_id, task_type))
+
+    def sync(self, desired: dict):
+        """
+        Приводит индекс к снимку {(user_id, task_type): время} за один проход.
+
+        Возвращает количество добавленных, перенесенных и удаленных уведомлений.
+        """
+        added = moved = removed = 0
+        for (user_id, task_type) in [key for key in self._entries if key not in desired]:
+            self.remove(user_id, task_type)
+            removed += 1
+        for (user_id, task_type), task_time in desired.items():
+            previous = self._entries.get((user_id, task_type))
+            if previous is None:
+                added += 1
+            elif previous != minute_of_day(task_time):
+                moved += 1
+            else:
+                continue
+            self.add(user_id, task_type, task_time)
+        return added, moved, removed
+
+    def due(self, minute: int):
+        return list(self._buckets.get(minute, ()))
+
+    async def dispatch(self, context, now: datetime = None):
+        """
+        Запускает рассылку для текущей минуты (и пропущенных, если задача опоздала).
+
+        Сама рассылка идет фоновой задачей, чтобы большая корзина не задерживала
+        следующий запуск планировщика.
+        """
+        now = (now or datetime.now(pytz.utc)).replace(second=0, microsecond=0)
+        if self._last_minute is None or now - self._last_minute > timedelta(minutes=MAX_CATCHUP_MINUTES):
+            minutes = [now]
+        else:
+            minutes = []
+            moment = self._last_minute + timedelta(minutes=1)
+            while moment <= now:
+                minutes.append(moment)
+                moment += timedelta(minutes=1)
+        self._last_minute = max(now, self._last_minute or now)
+
+        keys = []
+        for moment in minutes:
+            keys.extend(self.due(minute_of_day(moment)))
+        if not keys:
+            return
+
+        task = asyncio.create_task(self._fan_out(context, keys))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _fan_out(self, context, keys):
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def notify(user_id, task_type):
+            handler = self.handlers.get(task_type)
+            if not handler:
+                logger.warning(f"Нет обработчика для типа задачи {task_type}.")
+                return
+            async with semaphore:
+                # Плановая рассылка уступает очередь ответам пользователям
+                send_priority.set(BROADCAST)
+                try:
+                    await handler(context.dispatcher, context.pool, user_id)
+                except Exception as e:
+                    logger.error(f"Ошибка при отправке уведомления {task_type} пользователю {user_id}: {e}")
+
+        await asyncio.gather(*(notify(user_id, task_type) for user_id, task_type in keys))
+        logger.info(f"Разослано уведомлений: {len(keys)} за {time.monotonic() - started:.2f} с.")
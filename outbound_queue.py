@@ -0,0 +1,262 @@
+import asyncio
+import contextvars
+import itertools
+from collections import deque
+import logging
+import time
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений: ответы пользователю раньше плановых рассылок
+INTERACTIVE = 0
+BROADCAST = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BROADCAST: "broadcast"}
+
+# Приоритет отправок в текущей задаче; плановые рассылки выставляют BROADCAST
+send_priority = contextvars.ContextVar("send_priority", default=INTERACTIVE)
+
+# Сколько раз повторяем запрос после RetryAfter
+MAX_ATTEMPTS = 3
+# Границы гистограммы времени отправки (секунды)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def is_throttled_method(method: str) -> bool:
+    """Методы Bot API, которые Telegram ограничивает по частоте (отправка и правка сообщений)."""
+    return method.startswith(("send", "copy", "forward", "edit"))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self) -> float:
+        """Сколько ждать до следующего токена (0 - можно отправлять сразу)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _OutboundRequest:
+    __slots__ = ("chat_id", "call", "future", "priority", "enqueued_at", "attempts", "released")
+
+    def __init__(self, chat_id, call, future, priority):
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        # Запрос вернулся в очередь из отложенных своего чата и идет первым
+        self.released = False
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "inf"], self.counts)),
+        }
+
+
+class OutboundQueue:
+    """
+    Центральная очередь исходящих запросов к Telegram.
+
+    Глобальный token bucket держит общий лимит бота, отдельные bucket'ы - лимит
+    на один чат. Ответы пользователям обслуживаются раньше плановых рассылок,
+    а при RetryAfter очередь целиком ставится на паузу на указанное время.
+
+    Запрос в чат, исчерпавший свой лимит, не занимает воркер: он откладывается
+    в очередь чата и возвращается в общую очередь, когда у чата появится токен.
+    Порядок сообщений внутри чата сохраняется.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, workers: int, chat_burst: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self._chat_buckets = {}
+        # chat_id -> отложенные запросы чата по порядку
+        self._deferred = {}
+        self._queue = None
+        self._tasks = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._lock = None
+        self.depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self.latency = {priority: LatencyHistogram() for priority in PRIORITY_NAMES}
+        self.retries = 0
+        self.failures = 0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._lock = asyncio.Lock()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, chat_id, call, priority: int = None):
+        """Ставит запрос в очередь и ждет его результата."""
+        self._ensure_started()
+        priority = send_priority.get() if priority is None else priority
+        request = _OutboundRequest(chat_id, call, asyncio.get_running_loop().create_future(), priority)
+        self._put(request)
+        return await request.future
+
+    def _put(self, request):
+        self.depth[request.priority] += 1
+        self._queue.put_nowait((request.priority, next(self._sequence), request))
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _defer(self, request) -> bool:
+        """Берет токен чата или откладывает запрос до его появления. True - запрос отложен."""
+        chat_id = request.chat_id
+        if chat_id is None:
+            return False
+        released, request.released = request.released, False
+        waiting = self._deferred.get(chat_id)
+        if waiting is not None and not released:
+            # Раньше в этот чат уже стоят отложенные сообщения
+            waiting.append(request)
+            self.depth[request.priority] += 1
+            return True
+
+        bucket = self._chat_bucket(chat_id)
+        delay = bucket.delay()
+        if delay > 0:
+            if waiting is None:
+                waiting = self._deferred[chat_id] = deque()
+            waiting.appendleft(request)
+            self.depth[request.priority] += 1
+            asyncio.get_running_loop().call_later(delay, self._release, chat_id)
+            return True
+
+        bucket.take()
+        if waiting is not None:
+            if waiting:
+                asyncio.get_running_loop().call_later(bucket.delay(), self._release, chat_id)
+            else:
+                del self._deferred[chat_id]
+        return False
+
+    def _release(self, chat_id):
+        waiting = self._deferred.get(chat_id)
+        if self._queue is None or not waiting:
+            return
+        request = waiting.popleft()
+        request.released = True
+        self._queue.put_nowait((request.priority, next(self._sequence), request))
+
+    async def _wait_for_slot(self):
+        # Под общей блокировкой ждем только глобальный лимит: он один на всех
+        async with self._lock:
+            while True:
+                delay = max(self._paused_until - time.monotonic(), self.global_bucket.delay())
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self.global_bucket.take()
+
+    async def _worker(self):
+        while True:
+            _, _, request = await self._queue.get()
+            self.depth[request.priority] -= 1
+            try:
+                if self._defer(request):
+                    continue
+                await self._wait_for_slot()
+                request.attempts += 1
+                result = await request.call()
+            except RetryAfter as e:
+                self._paused_until = max(self._paused_until, time.monotonic() + e.timeout)
+                logger.warning(f"Telegram просит подождать {e.timeout} с, очередь на паузе "
+                               f"(чат {request.chat_id}, попытка {request.attempts}).")
+                if request.attempts < MAX_ATTEMPTS:
+                    self.retries += 1
+                    self._put(request)
+                else:
+                    self.failures += 1
+                    request.future.set_exception(e)
+            except asyncio.CancelledError:
+                request.future.cancel()
+                raise
+            except Exception as e:
+                self.failures += 1
+                if not request.future.done():
+                    request.future.set_exception(e)
+            else:
+                self.latency[request.priority].observe(time.monotonic() - request.enqueued_at)
+                if not request.future.done():
+                    request.future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "depth": {PRIORITY_NAMES[priority]: depth for priority, depth in self.depth.items()},
+            "latency": {PRIORITY_NAMES[priority]: histogram.summary()
+                        for priority, histogram in self.latency.items()},
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+class QueuedBot(Bot):
+    """Bot, который пропускает отправку сообщений через OutboundQueue."""
+
+    def __init__(self, *args, outbound_queue: OutboundQueue = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbound_queue = outbound_queue
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        if self.outbound_queue is None or not is_throttled_method(method):
+            return await super().request(method, data, files, **kwargs)
+
+        parent_request = super().request
+        chat_id = (data or {}).get("chat_id")
+        return await self.outbound_queue.submit(chat_id, lambda: parent_request(method, data, files, **kwargs))
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from yookassa import Configuration, Payment
+from config import PAYMENT_PROVIDER, PAYMENT_WORKERS, PAYMENT_TIMEOUT, PAYMENT_RETRIES, PAYMENT_STUB_LATENCY
+from outbound_queue import LatencyHistogram
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Пауза перед повтором (секунды), удваивается с каждой попыткой
+RETRY_DELAY = 0.5
+
+
+class YooKassaProvider:
+    """Синхронный SDK ЮKassa; вызывается только из потоков PaymentGateway."""
+
+    def __init__(self, timeout: float):
+        # Ограничиваем HTTP-запрос SDK, чтобы зависший запрос не занимал поток пула бесконечно
+        Configuration.timeout = timeout
+
+    def create(self, payment_data: dict, idempotency_key: str):
+        return Payment.create(payment_data, idempotency_key)
+
+    def find_one(self, payment_id: str):
+        return Payment.find_one(payment_id)
+
+
+class StubPaymentProvider:
+    """
+    Локальная заглушка ЮKassa для нагрузочных тестов: блокирует поток на latency
+    секунд, как настоящий HTTPS-запрос, и сразу считает платежи успешными.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._payments = {}
+
+    def create(self, payment_data: dict, idempotency_key: str):
+        time.sleep(self.latency)
+        payment = self._payments.get(idempotency_key)
+        if payment is None:
+            payment = SimpleNamespace(
+                id=str(uuid.uuid4()),
+                status="pending",
+                # Как и ЮKassa, возвращаем значения metadata строками
+                metadata={key: str(value) for key, value in payment_data.get("metadata", {}).items()},
+                confirmation=SimpleNamespace(confirmation_url="https://yookassa.invalid/checkout"),
+            )
+            self._payments[idempotency_key] = self._payments[payment.id] = payment
+        return payment
+
+    def find_one(self, payment_id: str):
+        time.sleep(self.latency)
+        payment = self._payments.get(payment_id)
+        if payment is None:
+            raise LookupError(f"Платеж {payment_id} не найден")
+        payment.status = "succeeded"
+        return payment
+
+
+class PaymentGateway:
+    """
+    Асинхронная обертка над платежным провайдером.
+
+    Блокирующие вызовы SDK выполняются в отдельном ограниченном пуле потоков,
+    поэтому цикл событий продолжает обслуживать других пользователей. У каждой
+    попытки есть таймаут; повторы создания платежа идут с тем же ключом
+    идемпотентности, так что второй платеж не появится.
+    """
+
+    def __init__(self, provider, workers: int, timeout: float, retries: int):
+        self.provider = provider
+        self.timeout = timeout
+        self.retries = retries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="payments")
+        self.latency = {"create": LatencyHistogram(), "find_one": LatencyHistogram()}
+        self.failures = 0
+
+    async def _call(self, operation: str, *args):
+        loop = asyncio.get_running_loop()
+        method = getattr(self.provider, operation)
+        for attempt in range(1, self.retries + 1):
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(loop.run_in_executor(self._executor, method, *args), self.timeout)
+                self.latency[operation].observe(time.monotonic() - started)
+                return result
+            except Exception as e:
+                if attempt == self.retries:
+                    self.failures += 1
+                    raise
+                logger.warning(f"Ошибка {operation} у платежного провайдера (попытка {attempt}): {e!r}")
+                await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+    async def create_payment(self, payment_data: dict, idempotency_key: str = None):
+        return await self._call("create", payment_data, idempotency_key or str(uuid.uuid4()))
+
+    async def find_payment(self, payment_id: str):
+        return await self._call("find_one", payment_id)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "latency": {operation: histogram.summary() for operation, histogram in self.latency.items()},
+            "failures": self.failures,
+        }
+
+
+def create_provider(name: str = PAYMENT_PROVIDER):
+    if name == "stub":
+        logger.warning("Платежи идут через локальную заглушку, деньги не списываются.")
+        return StubPaymentProvider(PAYMENT_STUB_LATENCY)
+    return YooKassaProvider(PAYMENT_TIMEOUT)
+
+
+payment_gateway = PaymentGateway(create_provider(), PAYMENT_WORKERS, PAYMENT_TIMEOUT, PAYMENT_RETRIES)
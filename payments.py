@@ -1,7 +1,7 @@
 import uuid
 import logging
 from aiogram import types
-from yookassa import Configuration, Payment
+from yookassa import Configuration
 from context import AppContext
 from middlewares.manager import activate_subscription
 from functools import partial
@@ -9,6 +9,8 @@ from aiogram.dispatcher import FSMContext
 from states import UserData
 from database.database import get_user_id_by_tg_user_id, check_existing_meal_times
 from handlers.meal_schedule_handler import choose_timezone
+from callback_router import callback_router
+from payment_gateway import payment_gateway
 
 
 # Инициализация ЮKassa
@@ -64,8 +66,8 @@ async def create_payment_link(amount, description, user_id):
     logging.info(f"Отправка данных платежа: {payment_data}")
 
     try:
-        # Создание платежа через ЮKassa
-        payment = Payment.create(payment_data)
+        # Создание платежа через ЮKassa (в пуле потоков, повторы с тем же ключом идемпотентности)
+        payment = await payment_gateway.create_payment(payment_data, idempotency_key=order_id)
 
         logging.info(f"Создан платеж: {payment.id}, confirmation_url: {payment.confirmation.confirmation_url}")
 
@@ -85,13 +87,14 @@ async def check_payment_status_handler(callback_query: types.CallbackQuery, stat
         payment_id = callback_query.data.split("_")[2]
         logging.info(f"Проверка статуса оплаты для платежа: {payment_id}")
 
-        payment = Payment.find_one(payment_id)
+        payment = await payment_gateway.find_payment(payment_id)
         logging.info(f"Получен статус платежа: {payment.status}")
 
         # Для проверки кода предоставляем подписку при любом статусе, кроме явно исключенных
         if payment.status in ["succeeded", "waiting_for_capture"]:
             # Активируем подписку даже при статусе waiting_for_capture для проверки
-            await activate_subscription(context.pool, payment.metadata["user_id"], 3)
+            # ЮKassa возвращает значения metadata строками, а кеши ключуются числовым tg_user_id
+            await activate_subscription(context.pool, int(payment.metadata["user_id"]), 3)
             await callback_query.message.edit_text("Оплата успешно завершена! Ваша подписка активирована.")
 
             # Проверка существующих данных времени приема пищи
@@ -127,12 +130,10 @@ async def check_payment_status_handler(callback_query: types.CallbackQuery, stat
 
 # Регистрация обработчика
 def register_payment_handlers(context: AppContext):
-    dp = context.dispatcher
-
     # Регистрация обработчика с передачей контекста
-    dp.register_callback_query_handler(
+    callback_router.add(
         partial(check_payment_status_handler, context=context),  # Передача контекста с использованием partial
-        lambda c: c.data and c.data.startswith("check_payment_"),
+        prefix="check_payment_",
         state=UserData.managing_subscription
     )
 
@@ -7,7 +7,13 @@ from context import AppContext
 from aiomysql import DictCursor
 from datetime import time, timedelta
 import asyncio
+from time import monotonic
 from apscheduler.triggers.interval import IntervalTrigger
+from notification_dispatcher import NotificationDispatcher, minute_of_day
+from config import NOTIFICATION_CONCURRENCY
+from sharding import shard_condition
+from database.pool_manager import maintain_pool
+from database.migrations import column_exists
 
 # Настройка логирования
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,11 +22,22 @@ logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s -
 logging.getLogger('apscheduler').setLevel(logging.WARNING)
 
 scheduler = AsyncIOScheduler()
+notification_dispatcher = NotificationDispatcher(handlers, concurrency=NOTIFICATION_CONCURRENCY)
 
 async def start_scheduler():
     scheduler.start()
 
 
+def to_time(task_time):
+    """aiomysql возвращает столбцы TIME как timedelta - приводим их к time."""
+    if isinstance(task_time, timedelta):
+        delta_seconds = task_time.total_seconds()
+        return time(hour=int(delta_seconds // 3600),
+                    minute=int((delta_seconds % 3600) // 60),
+                    second=int(delta_seconds % 60))
+    return task_time
+
+
 async def add_daily_task(context: AppContext, user_id: int, task_time: time, task_type: str, is_scheduled_call=False):
     task_name = f"{task_type}_notification_{user_id}"
     handler = handlers.get(task_type)
@@ -29,6 +46,9 @@ async def add_daily_task(context: AppContext, user_id: int, task_time: time, tas
         logging.warning(f"Нет обработчика для типа задачи {task_type}.")
         return
 
+    # Добавляем или переносим уведомление в минутной корзине диспетчера
+    notification_dispatcher.add(user_id, task_type, task_time)
+
     async with context.pool.acquire() as connection:
         async with connection.cursor(DictCursor) as cursor:
             try:
@@ -40,104 +60,150 @@ async def add_daily_task(context: AppContext, user_id: int, task_time: time, tas
                 existing_task = await cursor.fetchone()
 
                 if existing_task:
-                    db_task_time = existing_task['time']
-
-                    # Если время задачи изменилось, обновляем её
-                    if db_task_time != task_time:
-                        # Проверяем, есть ли задача в планировщике
-                        existing_job = scheduler.get_job(task_name)
-
-                        # Удаляем старую задачу из планировщика, если она существует и вызов не по расписанию
-                        if existing_job and not is_scheduled_call:
-                            try:
-                                existing_job.remove()
-                                logging.info(f"Удалена старая задача {task_name}.")
-                            except Exception as e:
-                                logging.error(f"Ошибка при удалении задачи {task_name}: {e}")
-
-                        # Добавляем новую задачу
-                        try:
-                            scheduler.add_job(
-                                handler,
-                                CronTrigger(hour=task_time.hour, minute=task_time.minute, timezone=pytz.utc),
-                                args=[context.dispatcher, context.pool, user_id],
-                                id=task_name,
-                                replace_existing=True
-                            )
-                            logging.info(f"Обновлена задача {task_name}")
-                        except Exception as e:
-                            logging.error(f"Ошибка при добавлении задачи {task_name}: {e}")
-
-                        # Обновляем задачу в базе данных
+                    # Если время задачи изменилось, обновляем её в базе данных
+                    if to_time(existing_task['time']) != task_time:
                         await cursor.execute(
                             "UPDATE scheduled_tasks SET time = %s WHERE user_id = %s AND task_name = %s AND task_type = %s",
                             (task_time, user_id, task_name, task_type)
                         )
                         await connection.commit()
+                        logging.info(f"Обновлена задача {task_name}")
                 else:
-                    # Добавляем новую задачу, если её нет в базе данных
-                    try:
-                        scheduler.add_job(
-                            handler,
-                            CronTrigger(hour=task_time.hour, minute=task_time.minute, timezone=pytz.utc),
-                            args=[context.dispatcher, context.pool, user_id],
-                            id=task_name,
-                            replace_existing=True
-                        )
-                        logging.info(f"Добавлена новая задача {task_name}")
-                    except Exception as e:
-                        logging.error(f"Ошибка при добавлении задачи {task_name}: {e}")
-
                     # Вставляем новую задачу в базу данных
                     await cursor.execute(
                         "INSERT INTO scheduled_tasks (user_id, task_name, time, task_type, is_active) VALUES (%s, %s, %s, %s, %s)",
                         (user_id, task_name, task_time, task_type, True)
                     )
                     await connection.commit()
+                    logging.info(f"Добавлена новая задача {task_name}")
             except Exception as e:
                 logging.error(f"Ошибка при проверке или вставке задачи {task_name} в базу данных: {e}")
 
 
 async def load_tasks_from_db(context: AppContext):
+    """
+    Сверяет диспетчер уведомлений с таблицей scheduled_tasks.
+
+    Таблица читается одним запросом, а в памяти применяются только изменения:
+    новые задачи, удаленные (или неактивные) и задачи с новым временем.
+    """
+    started = monotonic()
     async with context.pool.acquire() as connection:
         async with connection.cursor(DictCursor) as cursor:
             try:
-                # Загрузка активных задач
-                await cursor.execute("SELECT * FROM scheduled_tasks WHERE is_active = TRUE")
+                # Время базы на момент чтения становится отметкой для инкрементальной синхронизации
+                await cursor.execute("SELECT NOW(6) AS now")
+                snapshot_time = (await cursor.fetchone())['now']
+                condition, params = shard_condition(context)
+                await cursor.execute(
+                    f"SELECT user_id, task_type, time, is_active FROM scheduled_tasks WHERE {condition}", params
+                )
                 tasks = await cursor.fetchall()
-                logging.info(f"Извлечено {len(tasks)} активных задач из базы данных.")
-
-                for task in tasks:
-                    try:
-                        task_time = task['time']
-                        # Преобразуем timedelta в time, если это необходимо
-                        if isinstance(task_time, timedelta):
-                            delta_seconds = task_time.total_seconds()
-                            task_time = time(hour=int(delta_seconds // 3600),
-                                             minute=int((delta_seconds % 3600) // 60),
-                                             second=int(delta_seconds % 60))
-
-                        await add_daily_task(context, task['user_id'], task_time, task['task_type'])
-                    except Exception as e:
-                        logging.error(f"Ошибка при добавлении задачи {task}: {e}")
-
-                # Загрузка неактивных задач для удаления
-                await cursor.execute("SELECT * FROM scheduled_tasks WHERE is_active = FALSE")
-                inactive_tasks = await cursor.fetchall()
-
-                for task in inactive_tasks:
-                    try:
-                        task_name = f"{task['task_type']}_notification_{task['user_id']}"
-                        # Проверяем, существует ли задача в планировщике
-                        if existing_job := scheduler.get_job(task_name):
-                            existing_job.remove()
-                            logging.info(f"Удалена неактивная задача {task_name} из планировщика.")
-                        else:
-                            logging.info(f"Неактивная задача {task_name} уже удалена.")
-                    except Exception as e:
-                        logging.error(f"Ошибка при удалении задачи {task_name}: {e}")
             except Exception as e:
                 logging.error(f"Ошибка при извлечении задач из базы данных: {e}")
+                return
+
+    desired = {}
+    for task in tasks:
+        if not task['is_active']:
+            continue
+        if task['task_type'] not in handlers:
+            logging.warning(f"Нет обработчика для типа задачи {task['task_type']}.")
+            continue
+        desired[(task['user_id'], task['task_type'])] = to_time(task['time'])
+
+    added, moved, removed = notification_dispatcher.sync(desired)
+    task_change_feed.watermark = snapshot_time
+    logging.info(
+        f"Задачи загружены за {(monotonic() - started) * 1000:.1f} мс: строк {len(tasks)}, активных {len(desired)}, "
+        f"добавлено {added}, перенесено {moved}, удалено {removed}."
+    )
+
+
+class TaskChangeFeed:
+    """
+    Инкрементальная синхронизация диспетчера уведомлений с scheduled_tasks.
+
+    Все пути изменения задач (add_daily_task, update_task_status и правки в базе)
+    обновляют столбец updated_at, поэтому раз в несколько секунд достаточно
+    прочитать только строки, измененные после последней отметки.
+    """
+
+    # Перекрытие окна на случай транзакций, закоммиченных с более ранним updated_at
+    OVERLAP_SECONDS = 5
+
+    def __init__(self):
+        self.watermark = None
+
+    async def poll(self, context: AppContext):
+        if self.watermark is None:
+            await load_tasks_from_db(context)
+            return
+
+        condition, params = shard_condition(context)
+        async with context.pool.acquire() as connection:
+            async with connection.cursor(DictCursor) as cursor:
+                await cursor.execute("SELECT NOW(6) AS now")
+                now = (await cursor.fetchone())['now']
+                await cursor.execute(
+                    f"""
+                    SELECT user_id, task_type, time, is_active
+                    FROM scheduled_tasks
+                    WHERE updated_at >= %s AND {condition}
+                    """, (self.watermark - timedelta(seconds=self.OVERLAP_SECONDS), *params)
+                )
+                changes = await cursor.fetchall()
+                # Закрываем снимок чтения, чтобы следующий опрос видел свежие данные
+                await connection.commit()
+
+        applied = 0
+        for task in changes:
+            user_id, task_type = task['user_id'], task['task_type']
+            if task['is_active'] and task_type in handlers:
+                previous = notification_dispatcher.get_minute(user_id, task_type)
+                task_time = to_time(task['time'])
+                notification_dispatcher.add(user_id, task_type, task_time)
+                applied += previous != minute_of_day(task_time)
+            else:
+                applied += notification_dispatcher.remove(user_id, task_type)
+        self.watermark = now
+
+        if applied:
+            logging.info(f"Синхронизация задач: изменено строк {len(changes)}, применено изменений {applied}.")
+
+
+task_change_feed = TaskChangeFeed()
+
+
+async def sync_scheduled_tasks(context: AppContext):
+    try:
+        await task_change_feed.poll(context)
+    except Exception as e:
+        logging.error(f"Ошибка при синхронизации задач: {e}")
+
+
+async def schedule_task_sync(context: AppContext, interval_seconds: int = 5):
+    # Столбец updated_at добавляет миграция схемы (database/migrations.py)
+    try:
+        has_change_feed = await column_exists(context.pool, "scheduled_tasks", "updated_at")
+    except Exception as e:
+        logging.error(f"Не удалось проверить scheduled_tasks перед инкрементальной синхронизацией: {e}")
+        has_change_feed = False
+    if not has_change_feed:
+        # Без updated_at остается только периодическая полная перезагрузка
+        await schedule_task_reload(context)
+        return
+
+    scheduler.add_job(
+        sync_scheduled_tasks,
+        trigger=IntervalTrigger(seconds=interval_seconds),
+        args=[context],
+        id='sync_scheduled_tasks',
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1
+    )
+    logging.info(f"Инкрементальная синхронизация задач запланирована на каждые {interval_seconds} секунд.")
 
 
 async def reload_scheduled_tasks(context: AppContext):
@@ -161,6 +227,45 @@ async def schedule_task_reload(context: AppContext, interval_minutes: int= 61 ):
     )
     logging.info(f"Задача перезагрузки задач запланирована на каждые {interval_minutes} минут.")
 
+async def dispatch_notifications(context: AppContext):
+    await notification_dispatcher.dispatch(context)
+
+
+async def schedule_notification_dispatch(context: AppContext):
+    # Одна задача на каждую минуту вместо cron-задачи на каждого пользователя
+    scheduler.add_job(
+        dispatch_notifications,
+        CronTrigger(second=0, timezone=pytz.utc),
+        args=[context],
+        id='notification_dispatch',
+        replace_existing=True,
+        coalesce=True,
+        misfire_grace_time=30
+    )
+    logging.info("Диспетчер уведомлений запланирован на каждую минуту.")
+
+
+async def maintain_db_pool(context: AppContext):
+    try:
+        await maintain_pool(context.pool, notification_dispatcher)
+    except Exception as e:
+        logging.error(f"Ошибка при обслуживании пула соединений: {e}")
+
+
+async def schedule_pool_maintenance(context: AppContext):
+    # За 20 секунд до начала минуты: успеваем открыть соединения до рассылки
+    scheduler.add_job(
+        maintain_db_pool,
+        CronTrigger(second=40, timezone=pytz.utc),
+        args=[context],
+        id='db_pool_maintenance',
+        replace_existing=True,
+        coalesce=True,
+        misfire_grace_time=10
+    )
+    logging.info("Обслуживание пула соединений запланировано на каждую минуту.")
+
+
 async def log_all_jobs():
     """Логирование всех задач в планировщике."""
     jobs = scheduler.get_jobs()
@@ -184,3 +289,4 @@ async def log_all_jobs():
         logging.info(f"Задача: {job_info['id']}, "
                      f"Имя: {job_info['name']}, "
                      f"Следующее выполнение: {job_info['next_run_time']}")
+    logging.info(f"Уведомлений в диспетчере: {len(notification_dispatcher)}")
@@ -0,0 +1,209 @@
+"""
+Запуск бота несколькими процессами (шардами) с разбиением пользователей по tg_user_id.
+
+Координатор получает обновления от Telegram (webhook или long polling) и пересылает
+каждое в процесс-шард, которому принадлежит пользователь. Шарды - это обычный
+main.py в режиме webhook на локальном порту; каждый шард рассылает уведомления
+только своим пользователям из scheduled_tasks.
+
+    SHARD_COUNT=4 python sharding.py
+"""
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+from aiohttp import ClientError, ClientSession, web
+from aiogram import Bot
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений координатор пересылает шарду одним запросом
+FORWARD_BATCH_SIZE = 100
+# Пауза перед повторной пересылкой, если шард занят или недоступен
+FORWARD_RETRY_SECONDS = 0.5
+
+UPDATE_KINDS = ("message", "edited_message", "callback_query", "pre_checkout_query", "shipping_query",
+                "inline_query", "my_chat_member", "chat_member")
+
+
+def shard_for(tg_user_id: int, shard_count: int) -> int:
+    # Простой остаток от деления, чтобы то же условие можно было написать в SQL (MOD)
+    return tg_user_id % shard_count
+
+
+def shard_condition(context):
+    """Условие на scheduled_tasks.user_id, оставляющее только задачи шарда текущего процесса."""
+    if context.shard_count <= 1:
+        return "TRUE", ()
+    return ("user_id IN (SELECT id FROM users WHERE MOD(tg_user_id, %s) = %s)",
+            (context.shard_count, context.shard_id))
+
+
+def payload_user_id(payload: dict):
+    for kind in UPDATE_KINDS:
+        event = payload.get(kind)
+        if event and event.get("from"):
+            return event["from"]["id"]
+    return None
+
+
+class ShardRouter:
+    """
+    Пересылает обновления в шарды.
+
+    У каждого шарда своя очередь и один отправитель, поэтому обновления одного
+    пользователя приходят в шард в том порядке, в котором их прислал Telegram.
+    """
+
+    def __init__(self, shard_urls, queue_size: int, secret_token: str = None):
+        self.shard_urls = shard_urls
+        self.queue_size = queue_size
+        self.secret_token = secret_token
+        self._queues = []
+        self._tasks = []
+        self._session = None
+        self.forwarded = [0] * len(shard_urls)
+        self.retries = 0
+
+    def start(self):
+        self._session = ClientSession()
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.shard_urls]
+        self._tasks = [asyncio.create_task(self._sender(shard)) for shard in range(len(self.shard_urls))]
+
+    async def route(self, payload: dict):
+        """Ставит обновление в очередь его шарда; ждет, если очередь заполнена."""
+        user_id = payload_user_id(payload)
+        shard = shard_for(user_id if user_id is not None else payload["update_id"], len(self.shard_urls))
+        await self._queues[shard].put(payload)
+
+    async def _sender(self, shard: int):
+        queue = self._queues[shard]
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.secret_token} if self.secret_token else {}
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < FORWARD_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            while batch:
+                try:
+                    async with self._session.post(self.shard_urls[shard], json=batch, headers=headers) as response:
+                        accepted = (await response.json()).get("accepted", 0) if response.status in (200, 503) else 0
+                except (ClientError, ValueError) as e:
+                    logger.warning(f"Шард {shard} недоступен: {e}")
+                    accepted = 0
+                self.forwarded[shard] += accepted
+                batch = batch[accepted:]
+                if batch:
+                    self.retries += 1
+                    await asyncio.sleep(FORWARD_RETRY_SECONDS)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    def stats(self) -> dict:
+        return {
+            "depth": [queue.qsize() for queue in self._queues],
+            "forwarded": list(self.forwarded),
+            "retries": self.retries,
+        }
+
+
+def create_coordinator_app(router: ShardRouter, path: str, secret_token: str = None) -> web.Application:
+    async def handle_update(request: web.Request):
+        if secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            return web.Response(status=403)
+        await router.route(await request.json())
+        return web.Response(status=200)
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    return app
+
+
+async def poll_updates(bot: Bot, router: ShardRouter, timeout: int = 20):
+    """Long polling в координаторе: шарды получают обновления так же, как от webhook."""
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=timeout)
+        except Exception as e:
+            logger.error(f"Ошибка при получении обновлений: {e}")
+            await asyncio.sleep(FORWARD_RETRY_SECONDS)
+            continue
+        for update in updates:
+            await router.route(update.to_python())
+            offset = update.update_id + 1
+
+
+def shard_limits(shard_count: int, global_rate: float, pool_min: int, pool_max: int) -> dict:
+    """
+    Доли общих лимитов на один шард: лимит Telegram действует на весь бот,
+    а соединения MySQL - на весь сервер базы данных.
+    """
+    shard_pool_max = max(1, pool_max // shard_count)
+    return {
+        "TELEGRAM_GLOBAL_RATE": str(global_rate / shard_count),
+        "DB_POOL_MAX": str(shard_pool_max),
+        "DB_POOL_MIN": str(min(max(1, pool_min // shard_count), shard_pool_max)),
+    }
+
+
+def spawn_shards(shard_count: int, base_port: int, limits: dict):
+    """Запускает main.py для каждого шарда в режиме webhook на локальном порту."""
+    processes = []
+    for shard_id in range(shard_count):
+        env = dict(os.environ, SHARD_ID=str(shard_id), SHARD_COUNT=str(shard_count), BOT_MODE="webhook",
+                   WEBHOOK_URL="", WEBAPP_HOST="127.0.0.1", WEBAPP_PORT=str(base_port + shard_id), **limits)
+        processes.append(subprocess.Popen([sys.executable, "main.py"], env=env,
+                                          cwd=os.path.dirname(os.path.abspath(__file__))))
+        logger.info(f"Запущен шард {shard_id} на порту {base_port + shard_id}.")
+    return processes
+
+
+async def run_coordinator():
+    from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
+    from config import (BOT_TOKEN, BOT_MODE, TELEGRAM_API_URL, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+                        WEBAPP_HOST, WEBAPP_PORT, SHARD_COUNT, SHARD_BASE_PORT, UPDATE_QUEUE_SIZE,
+                        TELEGRAM_GLOBAL_RATE, DB_POOL_MIN, DB_POOL_MAX)
+
+    limits = shard_limits(SHARD_COUNT, TELEGRAM_GLOBAL_RATE, DB_POOL_MIN, DB_POOL_MAX)
+    processes = spawn_shards(SHARD_COUNT, SHARD_BASE_PORT, limits)
+    shard_urls = [f"http://127.0.0.1:{SHARD_BASE_PORT + shard_id}{WEBHOOK_PATH}" for shard_id in range(SHARD_COUNT)]
+    router = ShardRouter(shard_urls, UPDATE_QUEUE_SIZE, secret_token=WEBHOOK_SECRET)
+    router.start()
+
+    server = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else TELEGRAM_PRODUCTION
+    bot = Bot(token=BOT_TOKEN, server=server)
+    runner = None
+    try:
+        if BOT_MODE == "webhook":
+            runner = web.AppRunner(create_coordinator_app(router, WEBHOOK_PATH, WEBHOOK_SECRET))
+            await runner.setup()
+            await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+            await bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+            logger.info(f"Координатор принимает webhook на {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}.")
+            await asyncio.Event().wait()
+        else:
+            logger.info("Координатор получает обновления через long polling.")
+            await poll_updates(bot, router)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await router.close()
+        await (await bot.get_session()).close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_coordinator())
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько webhook-запрос ждет места в очереди, прежде чем вернуть Telegram 503
+ENQUEUE_TIMEOUT_SECONDS = 5
+# Как часто логируем глубину очереди и задержку обработки
+LAG_REPORT_SECONDS = 60
+
+
+def update_user_id(update: types.Update):
+    """Telegram ID пользователя, от которого пришло обновление (если есть)."""
+    for event in (update.message, update.edited_message, update.callback_query, update.pre_checkout_query,
+                  update.shipping_query, update.inline_query, update.my_chat_member):
+        if event is not None and event.from_user is not None:
+            return event.from_user.id
+    return None
+
+
+class UpdateWorkerPool:
+    """
+    Обработка входящих обновлений фиксированным числом воркеров.
+
+    Обновления одного пользователя всегда попадают в одну и ту же очередь,
+    поэтому шаги FSM обрабатываются по порядку. Очереди ограничены: когда они
+    заполнены, webhook отвечает Telegram 503, и тот повторит доставку позже.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, workers: int, queue_size: int):
+        self.dispatcher = dispatcher
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queues = []
+        self._tasks = []
+        self.processed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.max_lag = 0.0
+        self._lag_total = 0.0
+
+    def start(self):
+        per_worker = max(1, self.queue_size // self.workers)
+        self._queues = [asyncio.Queue(maxsize=per_worker) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        self._tasks.append(asyncio.create_task(self._report_lag()))
+        logger.info(f"Запущено воркеров обновлений: {self.workers}, размер очереди: {per_worker * self.workers}.")
+
+    def _queue_for(self, update: types.Update) -> asyncio.Queue:
+        user_id = update_user_id(update)
+        # hash кортежа перемешивает биты: у шарда все tg_user_id с одним остатком от деления,
+        # и простой остаток занял бы только часть очередей
+        return self._queues[hash((user_id or update.update_id,)) % len(self._queues)]
+
+    async def submit(self, update: types.Update) -> bool:
+        """Ставит обновление в очередь; False, если очередь так и не освободилась."""
+        queue = self._queue_for(update)
+        try:
+            await asyncio.wait_for(queue.put((time.monotonic(), update)), ENQUEUE_TIMEOUT_SECONDS)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+
+    async def _worker(self, queue: asyncio.Queue):
+        Bot.set_current(self.dispatcher.bot)
+        Dispatcher.set_current(self.dispatcher)
+        while True:
+            enqueued_at, update = await queue.get()
+            lag = time.monotonic() - enqueued_at
+            self.max_lag = max(self.max_lag, lag)
+            self._lag_total += lag
+            try:
+                # Через updates_handler, как при polling: иначе не вызываются
+                # on_pre/post_process_update у middleware (например, сессия базы данных)
+                await self.dispatcher.updates_handler.notify(update)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Ошибка при обработке обновления {update.update_id}: {e}")
+            finally:
+                self.processed += 1
+                queue.task_done()
+
+    async def _report_lag(self):
+        while True:
+            await asyncio.sleep(LAG_REPORT_SECONDS)
+            stats = self.stats()
+            logger.info(f"Очередь обновлений: в очереди {stats['depth']}, обработано {stats['processed']}, "
+                        f"отклонено {stats['rejected']}, задержка средняя {stats['avg_lag']:.3f} с, "
+                        f"максимальная {stats['max_lag']:.3f} с.")
+
+    async def close(self):
+        # Даем воркерам дообработать то, что Telegram уже считает доставленным
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "depth": sum(queue.qsize() for queue in self._queues),
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "avg_lag": self._lag_total / self.processed if self.processed else 0.0,
+            "max_lag": self.max_lag,
+        }
+
+
+def create_webhook_app(worker_pool: UpdateWorkerPool, path: str, secret_token: str = None) -> web.Application:
+    async def handle_update(request: web.Request):
+        if secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            return web.Response(status=403)
+        payload = await request.json()
+        # Telegram присылает одно обновление, координатор шардов - пачку
+        updates = payload if isinstance(payload, list) else [payload]
+        for accepted, data in enumerate(updates):
+            update = types.Update(**data)
+            if not await worker_pool.submit(update):
+                logger.warning(f"Очередь обновлений переполнена, обновление {update.update_id} отклонено.")
+                return web.json_response({"accepted": accepted}, status=503)
+        return web.json_response({"accepted": len(updates)})
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, webhook_url: str, path: str, host: str, port: int,
+                      workers: int, queue_size: int, secret_token: str = None):
+    """Принимает обновления через webhook, пока задачу не отменят."""
+    worker_pool = UpdateWorkerPool(dispatcher, workers, queue_size)
+    dispatcher.update_worker_pool = worker_pool
+    worker_pool.start()
+
+    runner = web.AppRunner(create_webhook_app(worker_pool, path, secret_token))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    if webhook_url:
+        await dispatcher.bot.set_webhook(webhook_url + path, secret_token=secret_token)
+        logger.info(f"Webhook слушает {host}:{port}{path}, адрес для Telegram: {webhook_url}{path}")
+    else:
+        # Шард за координатором: webhook в Telegram регистрирует координатор
+        logger.info(f"Прием обновлений на {host}:{port}{path} без регистрации webhook.")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Сначала перестаем принимать обновления, потом дорабатываем очередь
+        await runner.cleanup()
+        await worker_pool.close()